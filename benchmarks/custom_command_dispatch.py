@@ -0,0 +1,116 @@
+"""Compares custom command dispatch latency between the regular command path and the fast path.
+
+    python -m benchmarks.custom_command_dispatch [--iterations 20000]
+
+Nothing is sent to Discord: the HTTP call is replaced with one that returns the message
+right away, so the numbers are the bot's own overhead per invocation.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+os.environ.setdefault('ERROR_WEBHOOK', 'https://discord.com/api/webhooks/123456789012345678/' + 'a' * 68)
+
+import aiohttp
+import discord
+
+from main import TargetBot
+
+EMBED = {
+    'title': 'How to install the pack',
+    'description': 'Download it, then drop the zip in your resourcepacks folder.\n' * 5,
+    'color': 0x2F3136,
+    'fields': [{'name': f'Step {i}', 'value': 'Do the thing. ' * 10, 'inline': False} for i in range(5)],
+    'footer': {'text': 'Stylized Resource Pack'},
+}
+
+
+def message_data(content: str) -> Dict[str, Any]:
+    return {
+        'id': '1000000000000000000',
+        'channel_id': '2000000000000000000',
+        'content': content,
+        'author': {'id': '3000000000000000000', 'username': 'user', 'discriminator': '0', 'avatar': None},
+        'attachments': [],
+        'embeds': [],
+        'mentions': [],
+        'mention_roles': [],
+        'mention_everyone': False,
+        'pinned': False,
+        'tts': False,
+        'type': 0,
+        'flags': 0,
+        'timestamp': '2024-01-01T00:00:00+00:00',
+        'edited_timestamp': None,
+    }
+
+
+async def measure(bot: TargetBot, message: discord.Message, iterations: int) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await bot.process_commands(message)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(label: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99)]
+    print(
+        f'{label:<10} mean {statistics.fmean(timings) * 1e6:8.1f}µs  '
+        f'p50 {statistics.median(timings) * 1e6:8.1f}µs  p99 {p99 * 1e6:8.1f}µs'
+    )
+
+
+async def main(iterations: int) -> None:
+    async with aiohttp.ClientSession() as session:
+        bot = TargetBot(None, session)  # type: ignore # no database needed
+        # The bot never logs in, but Bot.get_context needs to know who it is.
+        bot._connection.user = discord.ClientUser(
+            state=bot._connection,
+            data={'id': '4000000000000000000', 'username': 'bot', 'discriminator': '0', 'avatar': None, 'bot': True},  # type: ignore
+        )
+        sent = 0
+
+        async def send_message(channel_id: int, *, params: Any) -> Dict[str, Any]:
+            nonlocal sent
+            sent += 1
+            return message_data('')
+
+        bot.http.send_message = send_message  # type: ignore
+        bot.add_command(
+            {
+                'command_string': 'install',
+                'command_content': 'Here you go:',
+                'embed': EMBED,
+                'aliases': ['howtoinstall'],
+                'description': 'How to install the pack.',
+                'cooldown_rate': 0,  # every invocation must be sent
+                'cooldown_per': None,
+                'checksum': None,
+            }
+        )
+
+        channel = discord.PartialMessageable(state=bot._connection, id=2000000000000000000)
+        message = discord.Message(state=bot._connection, channel=channel, data=message_data('!install'))  # type: ignore
+
+        for fast in (False, True):
+            bot.fast_custom_commands = fast
+            await measure(bot, message, iterations // 10)  # warm up
+            sent = 0
+            timings = await measure(bot, message, iterations)
+            assert sent == iterations, f'expected {iterations} sends, got {sent}'
+            report('fast path' if fast else 'regular', timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    asyncio.run(main(parser.parse_args().iterations))
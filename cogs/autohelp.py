@@ -1,6 +1,14 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, Optional
+
 import discord
 from discord.ext import commands
 
+from main import TargetBot
+from .utils.custom_commands import HandlerCommand
+
 support_link = (
     "https://support.patreon.com/hc/en-us/articles/212052266-Get-my-Discord-role#"
     ":~:text=I%20connected%20my%20Discord%20account%20to%20Patreon%2C%20but%20I%E"
@@ -9,37 +17,88 @@ support_link = (
 )
 
 
+def compile_triggers(phrases: Iterable[str]) -> Optional[re.Pattern[str]]:
+    """Compiles every trigger phrase into one case-insensitive pattern, longest phrases first
+    so they win over phrases they contain. Returns ``None`` if there are no phrases."""
+    phrases = sorted(phrases, key=len, reverse=True)
+    if not phrases:
+        return None
+    return re.compile('|'.join(map(re.escape, phrases)), re.IGNORECASE)
+
+
 class automod(commands.Cog):
-    IGNORED_ROLES = [
-        740351860325613598,  # @ Creator
-        717151202135113808,  # @ Admin
-        763960697506758676,  # @ Head Mod
-        801385716017004544,  # @ Moderator
-        813988893912203277,  # @ helper
-        754743164883173387,  # @minecraft mod
-        717144039568441394,  # @Sublimer
-        717144455156858940,  # @ Sapphirer
-        874395441477873694,  # @ Steeler
-        869040956350033930,  # @Forged Steeler
-        776996394191814658,  # downloads
-    ]
+    GUILD_ID = 717140270789033984
+    STONER_ROLE = 717144906350592061
+    IGNORED_ROLES = frozenset(
+        {
+            740351860325613598,  # @ Creator
+            717151202135113808,  # @ Admin
+            763960697506758676,  # @ Head Mod
+            801385716017004544,  # @ Moderator
+            813988893912203277,  # @ helper
+            754743164883173387,  # @minecraft mod
+            717144039568441394,  # @Sublimer
+            717144455156858940,  # @ Sapphirer
+            874395441477873694,  # @ Steeler
+            869040956350033930,  # @Forged Steeler
+            776996394191814658,  # downloads
+        }
+    )
 
     def __init__(self, bot):
-        self.bot: commands.Bot = bot
+        self.bot: TargetBot = bot
+        # casefolded phrase -> custom command to answer with, None for the downloads help
+        self.triggers: Dict[str, Optional[str]] = {}
+        self.pattern: Optional[re.Pattern[str]] = None
+
+    async def cog_load(self) -> None:
+        await self.load_triggers()
+
+    async def load_triggers(self) -> int:
+        """|coro| (Re)loads the triggers from the database and recompiles the pattern.
+
+        Returns
+        -------
+            How many triggers were loaded.
+        """
+        records = await self.bot.pool.fetch("SELECT phrase, command FROM autohelp_triggers")
+        triggers = {r['phrase'].casefold(): r['command'] for r in records}
+        self.pattern = compile_triggers(triggers)
+        self.triggers = triggers
+        return len(triggers)
+
+    @commands.command(name="reloadtriggers", hidden=True)
+    @commands.is_owner()
+    async def reload_triggers(self, ctx: commands.Context):
+        """Reloads the autohelp triggers from the database."""
+        count = await self.load_triggers()
+        await ctx.send(f"Loaded {count} autohelp triggers.")
 
     @commands.Cog.listener('on_message')
     async def automatic_support(self, message: discord.Message):
         if (
             message.author.bot
             or not message.guild
-            or message.guild.id != 717140270789033984
-            or "download" not in message.content.lower()
+            or message.guild.id != self.GUILD_ID
+            or self.pattern is None
+            or not (match := self.pattern.search(message.content))
             or not isinstance(message.author, discord.Member)
-            or any(message.author.get_role(r) for r in self.IGNORED_ROLES)
+            # Member._roles holds the role IDs, Member.roles would build every Role object.
+            or not self.IGNORED_ROLES.isdisjoint(message.author._roles)
         ):
             return
 
-        if message.author.get_role(717144906350592061):
+        phrase = match.group(0).casefold()
+        if phrase not in self.triggers:  # casefolding and IGNORECASE disagree on some characters
+            return
+        command_name = self.triggers[phrase]
+        if command_name is not None:
+            command = self.bot.get_command(command_name)
+            if isinstance(command, HandlerCommand) and await self.bot.check_custom_cooldown(command, message, react=False):
+                await message.reply(content=command.content, embeds=[command.embed] if command.embed else [])
+            return
+
+        if message.author.get_role(self.STONER_ROLE):
             embed = discord.Embed(
                 description=(
                     "I see you're asking about downloads. To access the download chnanel, you need to have a "
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import re
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Optional
 from logging import getLogger
 import asyncpg
 from asyncpg.transaction import Transaction
@@ -218,7 +218,7 @@ class CreateCommandModal(ui.Modal, title='Create a new custom command'):
                     else:
                         await conn.execute(self.ALIAS_QUERY, alias, name)
                         message += f"\n☑️ Alias OK: `{alias}`"
-            record = await conn.fetchrow(self.bot.CC_QUERY + '\nAND cc.command_string = $1', name)
+            record = await self.bot.fetch_custom_command(name, conn=conn)
             if record:
                 self.bot.add_command(record)
                 if interaction.response.is_done():
@@ -361,7 +361,7 @@ class CustomCommands(commands.Cog):
     @cc.command(name='edit', description='Edits a custom command')
     @app_commands.describe(command='The command you want to edit')
     async def cc_edit(self, interaction: discord.Interaction, command: str):
-        result = await self.bot.pool.fetchrow(self.bot.CC_QUERY + '\nAND command_string = $1', command)
+        result = await self.bot.fetch_custom_command(command)
         cmd = self.bot.get_command(command)
         if not result or not isinstance(cmd, HandlerCommand):
             return await interaction.response.send_message('Sorry, but that does not seem to be a command.', ephemeral=True)
@@ -391,25 +391,58 @@ class CustomCommands(commands.Cog):
         else:
             await interaction.response.send_message('Command and corresponding aliases deleted.')
 
+    @cc.command(name='cooldown', description='Sets how often a custom command can answer in the same channel.')
+    @app_commands.describe(
+        command='The command to set the cooldown of',
+        rate='How many answers are allowed per period, 0 to never hold back. Leave empty to use the default',
+        per='The period, in seconds',
+    )
+    async def cc_cooldown(
+        self,
+        interaction: discord.Interaction,
+        command: str,
+        rate: Optional[app_commands.Range[int, 0, 20]] = None,
+        per: app_commands.Range[float, 1, 3600] = 15.0,
+    ):
+        query = "UPDATE custom_commands SET cooldown_rate = $2, cooldown_per = $3 WHERE command_string = $1 AND aliases_to ISNULL"
+        status = await self.bot.pool.execute(query, command, rate, None if rate is None else per)
+        if status == 'UPDATE 0':
+            return await interaction.response.send_message('Sorry, but that does not seem to be a command.', ephemeral=True)
+
+        # Also notified, but don't rely on the listener being connected.
+        record = await self.bot.fetch_custom_command(command)
+        self.bot.apply_custom_commands([command], [record] if record else [])
+        if rate is None:
+            message = f'`{command}` now uses the default cooldown, which is none unless configured.'
+        elif rate == 0:
+            message = f'`{command}` no longer has a cooldown.'
+        else:
+            message = f'`{command}` can now answer {rate} time(s) every {per:g} seconds per channel.'
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @commands.command(name='ccstats', hidden=True)
+    @commands.is_owner()
+    async def cc_stats(self, ctx: commands.Context):
+        """Shows the custom command cooldown counters."""
+        cooldowns = self.bot.cc_cooldowns
+        lines = [
+            f"**Cooldowns:** {cooldowns.allowed} answered, {cooldowns.suppressed} suppressed, "
+            f"{len(cooldowns)} command/channel pairs tracked",
+        ]
+        for name, count in self.bot.cc_suppressed.most_common(10):
+            lines.append(f"`{name}`: {count} suppressed")
+        await ctx.send("\n".join(lines))
+
     @cc_delete.autocomplete('command')
     async def cc_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice]:
-        if len(current.strip()) > 2:
-            query = "SELECT command_string FROM custom_commands WHERE SIMILARITY(command_string, $1) > 0.1 LIMIT 25"
-            rows = await self.bot.pool.fetch(query, current.strip())
-        else:
-            query = "SELECT command_string FROM custom_commands ORDER BY SIMILARITY(command_string, $1) LIMIT 25"
-            rows = await self.bot.pool.fetch(query, current.strip())
-        return [app_commands.Choice(name=r['command_string'], value=r['command_string']) for r in rows]
+        names = self.bot.command_index.search(current)
+        return [app_commands.Choice(name=name, value=name) for name in names]
 
     @cc_edit.autocomplete('command')
+    @cc_cooldown.autocomplete('command')
     async def cce_autocomplete(self, interaction: discord.Interaction, current: str) -> list[app_commands.Choice]:
-        if len(current.strip()) > 2:
-            query = "SELECT command_string FROM custom_commands WHERE SIMILARITY(command_string, $1) > 0.1 AND aliases_to ISNULL LIMIT 25"
-            rows = await self.bot.pool.fetch(query, current.strip())
-        else:
-            query = "SELECT command_string FROM custom_commands WHERE aliases_to ISNULL ORDER BY SIMILARITY(command_string, $1) LIMIT 25"
-            rows = await self.bot.pool.fetch(query, current.strip())
-        return [app_commands.Choice(name=r['command_string'], value=r['command_string']) for r in rows]
+        names = self.bot.command_index.search(current, aliases=False)
+        return [app_commands.Choice(name=name, value=name) for name in names]
 
 
 async def setup(bot):
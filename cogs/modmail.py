@@ -1,64 +1,376 @@
 from __future__ import annotations
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from logging import getLogger
+from functools import partial
+from typing import Any, Awaitable, Callable, Coroutine, Iterator
 from typing_extensions import Self
 import discord
 import asyncpg
 import asyncio
-from discord.ext import commands
+import heapq
+import os
+import sys
+import time
+from discord.ext import commands, tasks
 from main import TargetBot
+from .utils.attachments import AttachmentDownloader
+from .utils.cache import ExpiringSet
+from .utils.locks import KeyedLock
 
 
 FORUM_CHANNEL_ID = 1360292638993154260
 BANNED_TAG_ID = 1360292846363476068
+NOT_A_TICKET_TTL = 300  # seconds a forum thread that isn't a ticket is remembered as such
+WEBHOOK_POOL_SIZE = 5  # webhooks created up front in the forum channel, discord allows 15 per channel
+WEBHOOK_SLOW_POST = 2.0
+WEBHOOK_RATELIMIT_COOLDOWN = 10.0  # seconds a rate limited webhook gets no new tickets
+WEBHOOK_MAX_CONCURRENCY = 1  # POSTs in flight per webhook, discord.py serializes each webhook's bucket anyway
+# Seconds to wait for more DMs before relaying a burst as one message, off unless set.
+DM_COALESCE_WINDOW = float(os.environ.get("DM_COALESCE_WINDOW", 0))
+DM_COALESCE_MAX_PARTS = 10
+ARCHIVED_THREAD_CACHE_SIZE = 500
+EDIT_DEBOUNCE = 1.0  # seconds edits to the same relayed message are coalesced for
+DM_CACHE_SIZE = 1000  # DM sessions kept in memory, evicted ones are loaded back from the database
+DM_CACHE_IDLE_TIMEOUT = 3600  # seconds without activity before a session is evicted
+MESSAGE_CACHE_SIZE = 100  # relayed message pairs kept in memory per DM, the rest lives in modmail_messages
 
 log = getLogger(__name__)
 
 
+@dataclass(slots=True)
+class BurstPart:
+    dm_message_id: int
+    content: str
+    deleted: bool = False
+
+
+@dataclass(slots=True)
+class Burst:
+    """Several DMs that were relayed as a single webhook message.
+
+    ``footer`` is whatever was appended after the parts' content, like the links to files that were too big.
+    """
+
+    parts: list[BurstPart]
+    footer: str = ""
+
+    def get(self, dm_message_id: int) -> BurstPart | None:
+        return discord.utils.get(self.parts, dm_message_id=dm_message_id)
+
+    def render(self) -> tuple[str, list[discord.Embed]]:
+        content = "\n".join(part.content for part in self.parts if not part.deleted)
+        if content:
+            content += self.footer
+
+        embeds: list[discord.Embed] = []
+        if len(content) > 2000:
+            embeds.append(discord.Embed(description=content))
+            content = ""
+        deleted = "\n".join(part.content for part in self.parts if part.deleted)
+        if deleted:
+            embeds.append(
+                discord.Embed(description=deleted, color=discord.Color.red()).set_footer(text="deleted message")
+            )
+        return content, embeds
+
+
+@dataclass(slots=True)
+class MessagePair:
+    """A message in DMs and its relayed counterpart in the thread.
+
+    ``webhook_id`` is only set when the message came from the user, in which
+    case the thread message belongs to that webhook. ``part`` is only set when
+    the message was coalesced with others into one thread message.
+    """
+
+    dm_message_id: int
+    thread_message_id: int
+    dm_channel_id: int
+    thread_id: int
+    webhook_id: int | None = None
+    part: int | None = None
+    burst: Burst | None = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_record(cls, record: asyncpg.Record) -> Self:
+        return cls(
+            dm_message_id=record["dm_message_id"],
+            thread_message_id=record["thread_message_id"],
+            dm_channel_id=record["dm_channel_id"],
+            thread_id=record["thread_id"],
+            webhook_id=record["webhook_id"],
+            part=record["part"],
+        )
+
+
+@dataclass
+class PendingBurst:
+    """DMs waiting for the coalescing window to close before being relayed together."""
+
+    thread: discord.Thread
+    messages: list[discord.Message] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+    def fits(self, message: discord.Message) -> bool:
+        return (
+            len(self.messages) < DM_COALESCE_MAX_PARTS
+            and sum(len(m.attachments) for m in self.messages) + len(message.attachments) <= 10
+            and sum(len(m.content) + 1 for m in self.messages) + len(message.content) < 1900
+        )
+
+
+class MessageMap:
+    """A bounded two-way mapping of relayed messages. The oldest pairs are dropped first."""
+
+    __slots__ = ("maxsize", "_by_dm", "_by_thread")
+
+    def __init__(self, maxsize: int = MESSAGE_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._by_dm: OrderedDict[int, MessagePair] = OrderedDict()
+        self._by_thread: dict[int, MessagePair] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_dm)
+
+    def add(self, pair: MessagePair) -> None:
+        self._by_dm[pair.dm_message_id] = pair
+        self._by_dm.move_to_end(pair.dm_message_id)
+        # With coalesced DMs several pairs share a thread message, the first part stands for it.
+        if pair.part is None or pair.thread_message_id not in self._by_thread:
+            self._by_thread[pair.thread_message_id] = pair
+        while len(self._by_dm) > self.maxsize:
+            _, old = self._by_dm.popitem(last=False)
+            if self._by_thread.get(old.thread_message_id) is old:
+                del self._by_thread[old.thread_message_id]
+
+    def get(self, message_id: int, *, from_guild: bool) -> MessagePair | None:
+        if from_guild:
+            return self._by_thread.get(message_id)
+        return self._by_dm.get(message_id)
+
+    def memory_usage(self) -> int:
+        size = sys.getsizeof(self._by_dm) + sys.getsizeof(self._by_thread)
+        bursts = {id(pair.burst): pair.burst for pair in self._by_dm.values() if pair.burst}
+        size += sum(sys.getsizeof(pair) for pair in self._by_dm.values())
+        for burst in bursts.values():
+            size += sys.getsizeof(burst) + sys.getsizeof(burst.footer)
+            size += sum(sys.getsizeof(part) + sys.getsizeof(part.content) for part in burst.parts)
+        return size
+
+    def remove(self, pair: MessagePair) -> None:
+        self._by_dm.pop(pair.dm_message_id, None)
+        if self._by_thread.get(pair.thread_message_id) is pair:
+            del self._by_thread[pair.thread_message_id]
+
+
 @dataclass
 class DM:
     user_id: int
     thread_id: int | None = None
-    messages: list[tuple[discord.Message, discord.Message]] = field(default_factory=list)
-    # list[tuple[(message in DMs, message in thread)]]
+    dm_channel_id: int | None = None
+    messages: MessageMap = field(default_factory=MessageMap)
+    in_flight: int = field(default=0, compare=False)
+    last_used: float = field(default_factory=time.monotonic, compare=False)
+    _cache: DMCache | None = field(default=None, repr=False, compare=False)
 
     @classmethod
     def from_record(cls, record: asyncpg.Record) -> Self:
         return cls(
             user_id=record["user_id"],
             thread_id=record["channel_id"],
+            dm_channel_id=record["dm_channel_id"],
         )
 
     def update(self, record: asyncpg.Record) -> None:
+        old_thread_id = self.thread_id
         self.thread_id = record["channel_id"]
+        self.dm_channel_id = record["dm_channel_id"] or self.dm_channel_id
+        if self._cache and old_thread_id != self.thread_id:
+            self._cache._move_thread(self, old_thread_id)
+
+    @contextmanager
+    def pin(self) -> Iterator[Self]:
+        """Keeps the session from being evicted while something is being relayed for it."""
+        self.in_flight += 1
+        try:
+            yield self
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
+    def memory_usage(self) -> int:
+        """A rough estimate, in bytes, of what this session and its cached messages take."""
+        return sys.getsizeof(self) + self.messages.memory_usage()
+
+
+class DMCache:
+    """Holds the DM sessions, indexed both by user id and by thread id.
+
+    Sessions are kept in least recently used order. Past ``maxsize`` sessions, or
+    after ``idle_timeout`` seconds without use, they are evicted unless pinned by
+    :meth:`DM.pin`. Evicted sessions are simply loaded back from the database.
+    """
+
+    __slots__ = ("maxsize", "idle_timeout", "_users", "_threads", "evicted")
+
+    def __init__(self, *, maxsize: int = DM_CACHE_SIZE, idle_timeout: float = DM_CACHE_IDLE_TIMEOUT) -> None:
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._users: OrderedDict[int, DM] = OrderedDict()
+        self._threads: dict[int, DM] = {}
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def values(self):
+        return self._users.values()
+
+    def _touch(self, dm: DM | None) -> DM | None:
+        if dm is not None:
+            dm.last_used = time.monotonic()
+            self._users.move_to_end(dm.user_id)
+        return dm
+
+    def get_user(self, user_id: int) -> DM | None:
+        return self._touch(self._users.get(user_id))
+
+    def get_thread(self, thread_id: int) -> DM | None:
+        return self._touch(self._threads.get(thread_id))
+
+    def load(self, record: asyncpg.Record) -> DM:
+        """Adds a session from a modmail record, updating the cached one if it already exists."""
+        dm = self._users.get(record["user_id"])
+        if dm is not None:
+            dm.update(record)
+            return self._touch(dm)  # type: ignore # not None
+
+        dm = DM.from_record(record)
+        dm._cache = self
+        self._users[dm.user_id] = dm
+        if dm.thread_id:
+            self._threads[dm.thread_id] = dm
+        if len(self._users) > self.maxsize:
+            self.evict()
+        return dm
+
+    def remove(self, dm: DM) -> None:
+        self._users.pop(dm.user_id, None)
+        if dm.thread_id and self._threads.get(dm.thread_id) is dm:
+            del self._threads[dm.thread_id]
+        dm._cache = None
+
+    def evict(self) -> int:
+        """Drops idle sessions and the least recently used ones past ``maxsize``. Returns how many were evicted."""
+        deadline = time.monotonic() - self.idle_timeout
+        evicted = 0
+        for dm in list(self._users.values()):
+            if len(self._users) <= self.maxsize and dm.last_used > deadline:
+                break  # everything after this was used more recently
+            if dm.in_flight:
+                continue
+            self.remove(dm)
+            evicted += 1
+        self.evicted += evicted
+        return evicted
+
+    def memory_usage(self) -> int:
+        return sum(dm.memory_usage() for dm in self._users.values())
+
+    def _move_thread(self, dm: DM, old_thread_id: int | None) -> None:
+        if old_thread_id and self._threads.get(old_thread_id) is dm:
+            del self._threads[old_thread_id]
+        if dm.thread_id:
+            self._threads[dm.thread_id] = dm
 
 
 class Webhook:
-    def __init__(self, webhook: discord.Webhook) -> None:
+    """A webhook of the pool, with one FIFO queue per thread it relays to.
+
+    Messages of a single ticket go out in the order they arrived, while tickets sharing
+    the webhook download their attachments concurrently. Only the POST itself goes
+    through ``_bucket``, discord.py then paces the requests using the rate limit headers.
+    """
+
+    def __init__(self, webhook: discord.Webhook, downloader: AttachmentDownloader) -> None:
         self.webhook = webhook
-        self.send_lock = asyncio.Lock()
-        self.channel_ids: list[int] = []
+        self.downloader = downloader
+        self.channel_ids: set[int] = set()
+        self.rate_limited_until = 0.0
+        self._bucket = asyncio.Semaphore(WEBHOOK_MAX_CONCURRENCY)
+        self._queues: dict[int, deque[tuple[float, asyncio.Future[discord.WebhookMessage | None], dict[str, Any]]]] = {}
+        self._drainers: set[asyncio.Task[None]] = set()
+        self.sent = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
 
-    async def send(self, *, message: discord.Message, thread: discord.Thread, dm: DM):
-        async with self.send_lock:
-            try:
-                content = message.content + '\n'
-                files: list[discord.File] = []
-                errored: list[str] = []
-                for attachment in message.attachments:
-                    if attachment.size < thread.guild.filesize_limit:
-                        files.append(await attachment.to_file())
-                    else:
-                        errored.append(f"[{attachment.filename}](<{attachment.url}>)")
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def active_threads(self) -> int:
+        return len(self._queues)
+
+    @property
+    def is_rate_limited(self) -> bool:
+        return self.rate_limited_until > time.monotonic()
+
+    def is_sending_to(self, thread_id: int) -> bool:
+        return thread_id in self._queues
+
+    async def send(
+        self, *, messages: list[discord.Message], thread: discord.Thread, reply_to: MessagePair | None = None
+    ) -> discord.WebhookMessage | None:
+        """Relays one or more DMs from the same user as a single webhook message."""
+        future: asyncio.Future[discord.WebhookMessage | None] = asyncio.get_running_loop().create_future()
+        job = (time.perf_counter(), future, dict(messages=messages, thread=thread, reply_to=reply_to))
+
+        queue = self._queues.get(thread.id)
+        if queue is None:
+            self._queues[thread.id] = queue = deque()
+            task = asyncio.create_task(self._drain(thread.id, queue))
+            self._drainers.add(task)
+            task.add_done_callback(self._drainers.discard)
+        queue.append(job)
+        return await future
+
+    async def _drain(self, thread_id: int, queue: deque) -> None:
+        try:
+            while queue:
+                queued_at, future, kwargs = queue.popleft()
+                if future.done():  # the caller went away
+                    continue
+                try:
+                    result = await self._send(queued_at=queued_at, **kwargs)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            del self._queues[thread_id]
+
+    async def _send(
+        self, *, queued_at: float, messages: list[discord.Message], thread: discord.Thread, reply_to: MessagePair | None
+    ) -> discord.WebhookMessage | None:
+        author = messages[0].author
+        attachments = [attachment for message in messages for attachment in message.attachments]
+        try:
+            async with self.downloader.download(attachments, size_limit=thread.guild.filesize_limit) as downloaded:
+                content = '\n'.join(message.content for message in messages) + '\n'
+                files = downloaded.files
+                errored = [f"[{attachment.filename}](<{attachment.url}>)" for attachment in downloaded.failed]
 
                 if errored:
                     content += f"\n-# Extra (too big) files: {', '.join(errored)}"
 
-                reference = message.reference
-                if reference and reference.message_id:
-                    msgs = discord.utils.find(lambda x: x[0].id == reference.message_id, dm.messages)
-                    if msgs:
-                        content += f"\n-# replying to [this message](<{msgs[1].jump_url}>)"
+                if reply_to:
+                    jump_url = thread.get_partial_message(reply_to.thread_message_id).jump_url
+                    content += f"\n-# replying to [this message](<{jump_url}>)"
 
                 if len(content) > 2000:
                     embeds = [discord.Embed(description=content)]
@@ -66,63 +378,204 @@ class Webhook:
                 else:
                     embeds = []
 
-                message_sent = await self.webhook.send(
-                    content=content,
-                    files=files,
-                    embeds=embeds,
-                    username=message.author.name,
-                    avatar_url=message.author.display_avatar.url,
-                    thread=thread,
-                    wait=True,
-                )
-                dm.messages.append((message, message_sent))
+                async with self._bucket:
+                    waited = time.perf_counter() - queued_at
+                    self.sent += 1
+                    self.wait_total += waited
+                    self.wait_max = max(self.wait_max, waited)
+                    started = time.perf_counter()
+                    sent = await self.webhook.send(
+                        content=content,
+                        files=files,
+                        embeds=embeds,
+                        username=author.name,
+                        avatar_url=author.display_avatar.url,
+                        thread=thread,
+                        wait=True,
+                    )
+                    # Without files a slow POST means discord.py waited out this webhook's bucket.
+                    if not files and time.perf_counter() - started > WEBHOOK_SLOW_POST:
+                        self.rate_limited_until = time.monotonic() + WEBHOOK_RATELIMIT_COOLDOWN
+                    return sent
 
-            except discord.HTTPException as e:
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self.rate_limited_until = time.monotonic() + WEBHOOK_RATELIMIT_COOLDOWN
+            for message in messages:
                 await message.add_reaction('\N{WARNING SIGN}')
-                await message.author.send(
-                    embed=discord.Embed(
-                        description='Failed to send message. You must provide <content> or <files>, or both.',
-                        color=discord.Color.red(),
-                    ),
-                    delete_after=20,
-                )
-                log.error('Could not send message', exc_info=e)
+            await author.send(
+                embed=discord.Embed(
+                    description='Failed to send message. You must provide <content> or <files>, or both.',
+                    color=discord.Color.red(),
+                ),
+                delete_after=20,
+            )
+            log.error('Could not send message', exc_info=e)
 
 
 class WebhookManager:
-    def __init__(self, webhooks: list[discord.Webhook]) -> None:
-        self.webhooks = [Webhook(w) for w in webhooks]
-        self._get_lock = asyncio.Lock()
-
-    async def get_webhook(self, channel_id: int) -> Webhook:
-        async with self._get_lock:
-            webhook_list = [w for w in self.webhooks if channel_id in w.channel_ids]
-            if not webhook_list:
-                kps = {len(w.channel_ids): w for w in self.webhooks}
-                webhook = kps[min(kps.keys())]
-                webhook.channel_ids.append(channel_id)
+    """Assigns threads to the least loaded webhook of the pool.
+
+    Loads live in a lazy min-heap of ``(load, index)`` entries, outdated entries are
+    skipped when popped. Rate limited webhooks are passed over for new threads, and
+    idle threads assigned to them are moved to another webhook on their next message.
+    """
+
+    def __init__(self, webhooks: list[discord.Webhook], downloader: AttachmentDownloader) -> None:
+        self.webhooks = [Webhook(w, downloader) for w in webhooks]
+        self._by_id = {w.webhook.id: w for w in self.webhooks}
+        self._positions = {w.webhook.id: index for index, w in enumerate(self.webhooks)}
+        self._assignments: dict[int, Webhook] = {}
+        self._heap: list[tuple[int, int]] = [(0, index) for index in range(len(self.webhooks))]
+        self.rebalanced = 0
+
+    def _push(self, webhook: Webhook) -> None:
+        heapq.heappush(self._heap, (len(webhook.channel_ids), self._positions[webhook.webhook.id]))
+        if len(self._heap) > 4 * len(self.webhooks):
+            self._heap = [(len(w.channel_ids), index) for index, w in enumerate(self.webhooks)]
+            heapq.heapify(self._heap)
+
+    def _least_loaded(self) -> Webhook:
+        skipped: list[tuple[int, int]] = []
+        webhook = None
+        while self._heap:
+            load, index = heapq.heappop(self._heap)
+            candidate = self.webhooks[index]
+            if load != len(candidate.channel_ids):
+                continue  # outdated entry, a fresh one is in the heap
+            if candidate.is_rate_limited:
+                skipped.append((load, index))
+                continue
+            webhook = candidate
+            break
+
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        if webhook is None:  # every webhook is rate limited, use the least loaded one anyway
+            webhook = min(self.webhooks, key=lambda w: len(w.channel_ids))
+        return webhook
+
+    def get_webhook(self, channel_id: int) -> Webhook:
+        webhook = self._assignments.get(channel_id)
+        if webhook is not None:
+            if not webhook.is_rate_limited or webhook.is_sending_to(channel_id):
                 return webhook
-            return webhook_list[0]
+            # Move the ticket away from the rate limited webhook, its queue is empty so order is kept.
+            self.release(channel_id)
+            self.rebalanced += 1
+
+        webhook = self._least_loaded()
+        webhook.channel_ids.add(channel_id)
+        self._assignments[channel_id] = webhook
+        self._push(webhook)
+        return webhook
+
+    def release(self, channel_id: int) -> None:
+        webhook = self._assignments.pop(channel_id, None)
+        if webhook is not None:
+            webhook.channel_ids.discard(channel_id)
+            self._push(webhook)
+
+    def get(self, webhook_id: int) -> Webhook | None:
+        return self._by_id.get(webhook_id)
 
 
 class ModMail(commands.Cog):
     def __init__(self, bot) -> None:
         self.bot: TargetBot = bot
-        self.dms: dict[int, DM] = {}
+        self.dms = DMCache()
+        self.not_tickets: ExpiringSet[int] = ExpiringSet(ttl=NOT_A_TICKET_TTL)
+        # discord.py drops archived threads from its cache, they are kept here so tickets can be reopened.
+        self.archived_threads: OrderedDict[int, discord.Thread] = OrderedDict()
         self.manager: WebhookManager | None = None
+        self._manager_lock = asyncio.Lock()
+        self.downloader = AttachmentDownloader(bot.session)
+        self.pending_bursts: dict[int, PendingBurst] = {}  # user id -> DMs waiting to be coalesced
+        self._tasks: set[asyncio.Task[None]] = set()
+        # DMs are processed one at a time per user, so a burst of them can't create several threads.
+        self.user_locks: KeyedLock[int] = KeyedLock()
+        # Relayed message id -> (timer, latest edit), see schedule_edit.
+        self.pending_edits: dict[int, tuple[asyncio.TimerHandle, Callable[[], Awaitable[Any]]]] = {}
+        # Thread ids and DM channel ids of open tickets, raw events outside of it are ignored.
+        self.active_channels: set[int] = set()
+        self.dm_channels: dict[int, int] = {}  # DM channel id -> user id
+        self.stats: Counter[str] = Counter()
+
+    async def cog_load(self) -> None:
+        # Needs the columns from the schema, run create_tables.py before starting the bot after an update.
+        records = await self.bot.pool.fetch("SELECT * FROM modmail WHERE channel_id IS NOT NULL AND NOT archived")
+        for record in records:
+            self.open_ticket(self.dms.load(record))
+        log.info("Loaded %s open modmail tickets", len(records))
+        self.evict_sessions.start()
+
+    async def cog_unload(self) -> None:
+        self.evict_sessions.cancel()
+
+    @tasks.loop(minutes=5)
+    async def evict_sessions(self) -> None:
+        evicted = self.dms.evict()
+        if evicted:
+            log.debug("Evicted %s idle modmail sessions, %s left", evicted, len(self.dms))
+
+    def open_ticket(self, dm: DM) -> None:
+        if dm.dm_channel_id:
+            self.dm_channels[dm.dm_channel_id] = dm.user_id
+        if dm.thread_id:
+            self.active_channels.add(dm.thread_id)
+        if dm.dm_channel_id:
+            self.active_channels.add(dm.dm_channel_id)
+
+    async def close_ticket(self, thread_id: int) -> None:
+        if thread_id not in self.active_channels:
+            return
+        self.active_channels.discard(thread_id)
+        if self.manager:
+            self.manager.release(thread_id)
+        dm = await self.get_thread_dm(thread_id)
+        if dm and dm.dm_channel_id:
+            self.active_channels.discard(dm.dm_channel_id)
+            self.dm_channels.pop(dm.dm_channel_id, None)
+
+    async def reopen_ticket(self, thread_id: int) -> None:
+        if thread_id in self.active_channels:
+            return
+        dm = await self.get_thread_dm(thread_id)
+        if dm:
+            self.open_ticket(dm)
+
+    async def set_archived(self, thread_id: int, archived: bool) -> None:
+        """Records whether a ticket's thread is archived, only the tickets that aren't are loaded at boot."""
+        await self.bot.pool.execute(
+            "UPDATE modmail SET archived = $2 WHERE channel_id = $1 AND archived <> $2", thread_id, archived
+        )
+
+    def is_relevant(self, channel_id: int) -> bool:
+        """Cheap check for raw events, tells whether the channel belongs to an open ticket."""
+        if channel_id in self.active_channels:
+            self.stats["prefilter_hits"] += 1
+            return True
+        self.stats["prefilter_misses"] += 1
+        return False
 
     async def get_manager(self) -> WebhookManager:
+        if self.manager:
+            return self.manager
+
         await self.bot.wait_until_ready()
-        if not self.manager:
-            webhooks = await self.forum_channel.webhooks()
-            if not webhooks:
-                while True:
+        async with self._manager_lock:
+            if not self.manager:
+                # Only webhooks with a token, the ones the bot created, can be used to send.
+                webhooks = [w for w in await self.forum_channel.webhooks() if w.token]
+                while len(webhooks) < WEBHOOK_POOL_SIZE:
                     try:
-                        await self.forum_channel.create_webhook(name="ModMail")
-                    except:
-                        log.error("Failed creating webhook.")
+                        webhooks.append(await self.forum_channel.create_webhook(name="ModMail"))
+                    except discord.HTTPException as e:
+                        log.error("Failed creating webhook, continuing with %s.", len(webhooks), exc_info=e)
                         break
-            self.manager = WebhookManager(webhooks)
+                if not webhooks:
+                    raise RuntimeError("No ModMail webhooks available")
+                self.manager = WebhookManager(webhooks, self.downloader)
         return self.manager
 
     @property
@@ -136,30 +589,76 @@ class ModMail(commands.Cog):
         return channel
 
     async def get_dm_object(self, obj: discord.User | discord.Member | discord.Thread) -> DM | None:
-        """gets a DM object from the database or cache"""
+        """gets a DM object from the database or cache, creating it for new users"""
         if isinstance(obj, discord.abc.User):
-            dm = self.dms.get(obj.id)
-            query = "SELECT * FROM modmail WHERE user_id = $1"
-            fallback = "INSERT INTO modmail (user_id) VALUES ($1)"
-        else:
+            return await self.get_user_dm(obj.id)
+        return await self.get_thread_dm(obj.id)
 
-            def pred(dm: DM):
-                return dm.thread_id == obj.id
+    async def get_thread_dm(self, thread_id: int) -> DM | None:
+        dm = self.dms.get_thread(thread_id)
+        if dm or thread_id in self.not_tickets:
+            return dm
+        record = await self.bot.pool.fetchrow("SELECT * FROM modmail WHERE channel_id = $1", thread_id)
+        if not record:
+            self.not_tickets.add(thread_id)
+            return None
+        return self.dms.load(record)
 
-            dm = discord.utils.find(pred, self.dms.values())
-            query = "SELECT * FROM modmail WHERE channel_id = $1"
-            fallback = None
+    async def get_user_dm(self, user_id: int) -> DM:
+        dm = self.dms.get_user(user_id)
         if dm:
             return dm
-        record = await self.bot.pool.fetchrow(query, obj.id)
-        if not record:
-            if fallback:
-                await self.bot.pool.execute(fallback, obj.id)
-                record = await self.bot.pool.fetchrow(query, obj.id)
+        # The no-op update makes RETURNING hand back the row even if it already existed.
+        record = await self.bot.pool.fetchrow(
+            'INSERT INTO modmail (user_id) VALUES ($1) ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id RETURNING *',
+            user_id,
+        )
+        return self.dms.load(record)  # type: ignore # RETURNING always yields the row
+
+    async def set_dm_channel(self, dm: DM, channel_id: int) -> None:
+        """Remembers the user's DM channel so edits and deletes there never need a fetch_channel."""
+        if dm.dm_channel_id != channel_id:
+            dm.dm_channel_id = channel_id
+            await self.bot.pool.execute("UPDATE modmail SET dm_channel_id = $1 WHERE user_id = $2", channel_id, dm.user_id)
+        self.open_ticket(dm)
+
+    async def store_pair(self, dm: DM, *pairs: MessagePair) -> None:
+        """Caches relayed message pairs and persists them so they survive restarts."""
+        for pair in pairs:
+            dm.messages.add(pair)
+        await self.bot.pool.executemany(
+            """INSERT INTO modmail_messages (dm_message_id, thread_message_id, user_id, dm_channel_id, thread_id, webhook_id, part)
+            VALUES ($1, $2, $3, $4, $5, $6, $7) ON CONFLICT DO NOTHING""",
+            [
+                (p.dm_message_id, p.thread_message_id, dm.user_id, p.dm_channel_id, p.thread_id, p.webhook_id, p.part)
+                for p in pairs
+            ],
+        )
+
+    async def get_pair(self, dm: DM, message_id: int, *, from_guild: bool) -> MessagePair | None:
+        """Looks up a relayed message pair by the id of either of its messages."""
+        pair = dm.messages.get(message_id, from_guild=from_guild)
+        if pair:
+            return pair
+
+        if from_guild:
+            # The parts of a coalesced burst share the thread message, the first part stands for it like in MessageMap.
+            query = "SELECT * FROM modmail_messages WHERE thread_message_id = $1 ORDER BY part NULLS FIRST LIMIT 1"
+        else:
+            query = "SELECT * FROM modmail_messages WHERE dm_message_id = $1"
+        record = await self.bot.pool.fetchrow(query, message_id)
         if record:
-            dm = DM.from_record(record)
-            self.dms[obj.id] = dm
-            return dm
+            pair = MessagePair.from_record(record)
+            dm.messages.add(pair)
+            return pair
+
+    async def forget_pair(self, dm: DM, pair: MessagePair) -> None:
+        dm.messages.remove(pair)
+        await self.bot.pool.execute(
+            "DELETE FROM modmail_messages WHERE dm_message_id = $1 AND thread_message_id = $2",
+            pair.dm_message_id,
+            pair.thread_message_id,
+        )
 
     @commands.Cog.listener("on_message")
     async def events_handler(self, message: discord.Message):
@@ -168,16 +667,19 @@ class ModMail(commands.Cog):
             return
 
         if message.channel.type is discord.ChannelType.private:
-            dm = await self.get_dm_object(message.author)
+            async with self.user_locks(message.author.id):
+                dm = await self.get_dm_object(message.author)
 
-            if dm:
-                await self.process_dm(message, dm)
+                if dm:
+                    with dm.pin():
+                        await self.process_dm(message, dm)
             return
 
         elif isinstance(message.channel, discord.Thread) and message.channel.parent_id == FORUM_CHANNEL_ID:
             dm = await self.get_dm_object(message.channel)
             if dm:
-                return await self.process_message(message, dm)
+                with dm.pin():
+                    return await self.process_message(message, dm)
             await message.delete()
 
     async def make_thread(self, message: discord.Message, dm: DM) -> discord.Thread:
@@ -192,39 +694,138 @@ class ModMail(commands.Cog):
             name=str(message.author), content=f'DM with user of ID: {message.author.id}'
         )
         data = await self.bot.pool.fetchrow(
-            'INSERT INTO modmail (user_id, channel_id) VALUES ($1, $2) ON CONFLICT (user_id) DO UPDATE SET channel_id = $2 RETURNING *',
+            'INSERT INTO modmail (user_id, channel_id) VALUES ($1, $2) '
+            'ON CONFLICT (user_id) DO UPDATE SET channel_id = $2, archived = FALSE RETURNING *',
             message.author.id,
             thread.id,
         )
         if data:
             dm.update(data)
+        self.not_tickets.discard(thread.id)
         return thread
 
-    async def process_dm(self, message: discord.Message, dm: DM):
-        """Takes a message and sends it to the DM channel"""
-        if not dm.thread_id:
-            thread = await self.make_thread(message, dm)
-        else:
+    async def resolve_thread(self, message: discord.Message, dm: DM) -> discord.Thread:
+        """Gets the ticket's thread, unarchiving it if needed. A new thread is only made when the old one is gone."""
+        if dm.thread_id:
             thread = self.forum_channel.get_thread(dm.thread_id)
+            if thread:
+                self.stats["thread_cache_hits"] += 1
+                return thread
 
-        if not thread:
-            thread = await self.make_thread(message, dm)
+            thread = self.archived_threads.pop(dm.thread_id, None)
+            if thread:
+                self.stats["archived_cache_hits"] += 1
+            else:
+                self.stats["thread_fetches"] += 1
+                try:
+                    thread = await self.bot.fetch_channel(dm.thread_id)
+                except (discord.NotFound, discord.Forbidden):
+                    thread = None
 
-            row = await self.bot.pool.fetchrow(
-                "UPDATE modmail SET channel_id = $1 WHERE user_id = $2 RETURNING *",
-                thread.id,
-                message.author.id,
-            )
-            if not row:
-                return
-            dm.update(row)
+            if isinstance(thread, discord.Thread):
+                if not thread.archived:
+                    return thread
+                try:
+                    thread = await thread.edit(archived=False)
+                except discord.HTTPException as e:
+                    log.warning("Could not unarchive modmail thread %s, making a new one", thread.id, exc_info=e)
+                else:
+                    self.stats["thread_unarchives"] += 1
+                    return thread
+
+        self.stats["thread_creations"] += 1
+        return await self.make_thread(message, dm)
+
+    async def process_dm(self, message: discord.Message, dm: DM):
+        """Takes a message and sends it to the DM channel"""
+        thread = await self.resolve_thread(message, dm)
 
         if BANNED_TAG_ID in thread._applied_tags:
             return await message.author.send("You are blacklisted from the modmail.")
 
+        await self.set_dm_channel(dm, message.channel.id)
+
+        # Replies keep their own message so the reference can be shown, anything queued goes out first.
+        if not DM_COALESCE_WINDOW or message.reference:
+            await self.flush_burst(dm)
+            return await self.relay_dms([message], dm, thread)
+
+        pending = self.pending_bursts.get(dm.user_id)
+        if pending and (pending.thread != thread or not pending.fits(message)):
+            await self.flush_burst(dm)
+            pending = None
+        if pending is None:
+            self.pending_bursts[dm.user_id] = pending = PendingBurst(thread)
+            dm.in_flight += 1  # released by flush_burst
+        pending.messages.append(message)
+
+        if pending.timer:
+            pending.timer.cancel()
+        pending.timer = asyncio.get_running_loop().call_later(
+            DM_COALESCE_WINDOW, lambda: self.spawn(self.flush_burst_locked(dm), name="modmail burst")
+        )
+
+    def spawn(self, coro: Coroutine[Any, Any, None], *, name: str) -> None:
+        """Runs a background coroutine, reporting its errors like any other event."""
+
+        async def runner():
+            try:
+                await coro
+            except Exception as e:
+                await self.bot.errors.add_error(error=e, ctx=name)
+
+        task = asyncio.create_task(runner())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush_burst(self, dm: DM) -> None:
+        pending = self.pending_bursts.pop(dm.user_id, None)
+        if not pending:
+            return
+        if pending.timer:
+            pending.timer.cancel()
+        try:
+            if pending.messages:
+                self.stats["coalesced_dms"] += len(pending.messages) - 1
+                await self.relay_dms(pending.messages, dm, pending.thread)
+        finally:
+            dm.in_flight -= 1
+
+    async def flush_burst_locked(self, dm: DM) -> None:
+        async with self.user_locks(dm.user_id):
+            await self.flush_burst(dm)
+
+    async def relay_dms(self, messages: list[discord.Message], dm: DM, thread: discord.Thread) -> None:
+        reply_to = None
+        reference = messages[0].reference
+        if len(messages) == 1 and reference and reference.message_id:
+            reply_to = await self.get_pair(dm, reference.message_id, from_guild=False)
+
         manager = await self.get_manager()
-        webhook = await manager.get_webhook(thread.id)
-        await webhook.send(message=message, thread=thread, dm=dm)
+        webhook = manager.get_webhook(thread.id)
+        message_sent = await webhook.send(messages=messages, thread=thread, reply_to=reply_to)
+        if not message_sent:
+            return
+
+        pairs = [
+            MessagePair(
+                dm_message_id=message.id,
+                thread_message_id=message_sent.id,
+                dm_channel_id=message.channel.id,
+                thread_id=thread.id,
+                webhook_id=webhook.webhook.id,
+            )
+            for message in messages
+        ]
+        if len(pairs) > 1:
+            body = "\n".join(message.content for message in messages)
+            rendered = message_sent.content or (message_sent.embeds[0].description if message_sent.embeds else None) or ""
+            footer = rendered[len(body) :] if rendered.startswith(body) else ""
+            burst = Burst([BurstPart(m.id, m.content) for m in messages], footer=footer)
+            for index, pair in enumerate(pairs):
+                pair.part = index
+                pair.burst = burst
+        await self.store_pair(dm, *pairs)
 
     async def process_message(self, message: discord.Message, dm: DM) -> None:
         user = self.bot.get_user(dm.user_id)
@@ -237,99 +838,165 @@ class ModMail(commands.Cog):
         reply = None
         reference = message.reference
         if reference and reference.message_id:
-
-            found_messages = discord.utils.find(lambda x: x[1].id == reference.message_id, dm.messages)
-            if found_messages:
+            found_pair = await self.get_pair(dm, reference.message_id, from_guild=True)
+            if found_pair:
                 reply = discord.MessageReference(
-                    message_id=found_messages[0].id,
-                    channel_id=found_messages[0].channel.id,
+                    message_id=found_pair.dm_message_id,
+                    channel_id=found_pair.dm_channel_id,
                     guild_id=None,
                     fail_if_not_exists=False,
                 )
 
-        content = message.content + '\n'
-        files: list[discord.File] = []
-        errored: list[str] = []
-        for attachment in message.attachments:
-            if attachment.size < self.forum_channel.guild.filesize_limit:
-                files.append(await attachment.to_file())
-            else:
-                errored.append(f"[{attachment.filename}]({attachment.url})")
-
-        if errored:
-            content += f"\n-# Some files could not be sent. Here are links instead: {', '.join(errored)}"
+        size_limit = self.forum_channel.guild.filesize_limit
+        async with self.downloader.download(message.attachments, size_limit=size_limit) as downloaded:
+            content = message.content + '\n'
+            files = downloaded.files
+            errored = [f"[{attachment.filename}]({attachment.url})" for attachment in downloaded.failed]
 
-        if len(files) > len(message.attachments):
-            content += "\n\n*some files could not be sent due to filesize limit*"
+            if errored:
+                content += f"\n-# Some files could not be sent. Here are links instead: {', '.join(errored)}"
 
-        try:
             try:
-                msg = await user.send(content=content, files=files, reference=reply)
+                try:
+                    msg = await user.send(content=content, files=files, reference=reply)
+                except discord.HTTPException:
+                    await message.channel.send(embed=discord.Embed(title="User has DMs closed."), delete_after=5)
+                    return await message.add_reaction('\N{NO ENTRY}')
             except discord.HTTPException:
-                await message.channel.send(embed=discord.Embed(title="User has DMs closed."), delete_after=5)
-                return await message.add_reaction('\N{NO ENTRY}')
-            else:
-                dm.messages.append((msg, message))
-        except discord.HTTPException:
-            pass
+                return
+
+        await self.set_dm_channel(dm, msg.channel.id)
+        pair = MessagePair(
+            dm_message_id=msg.id,
+            thread_message_id=message.id,
+            dm_channel_id=msg.channel.id,
+            thread_id=message.channel.id,
+        )
+        await self.store_pair(dm, pair)
 
     async def find_thread_messages(
         self, data: discord.RawMessageDeleteEvent | discord.RawMessageUpdateEvent
-    ) -> tuple[discord.Message, discord.Message, DM, bool] | None:
+    ) -> tuple[MessagePair, DM, bool] | None:
         is_guild = False
         dm = None
         if data.guild_id:
+            # The prefilter already made sure this is a ticket's thread.
             is_guild = True
-            thread = self.forum_channel.get_thread(data.channel_id)
-            if not thread:
-                thread = await self.forum_channel.guild.fetch_channel(data.channel_id)
+            dm = await self.get_thread_dm(data.channel_id)
 
-            if not isinstance(thread, discord.Thread) or thread.parent != self.forum_channel:
-                return
-            dm = await self.get_dm_object(thread)
-
-        else:
-            if data.cached_message:
-                dm = await self.get_dm_object(data.cached_message.author)
-            else:
-                try:
-                    channel = await self.bot.fetch_channel(data.channel_id)
-                except discord.HTTPException:
-                    return
-
-                if isinstance(channel, discord.DMChannel):
-                    if channel.recipient:
-                        dm = await self.get_dm_object(channel.recipient)
+        elif user_id := self.dm_channels.get(data.channel_id):
+            dm = await self.get_user_dm(user_id)
 
         if not dm:
             return
-        msgs = discord.utils.find(lambda m: m[int(is_guild)].id == data.message_id, dm.messages)
-        if msgs:
-            return *msgs, dm, is_guild
+        pair = await self.get_pair(dm, data.message_id, from_guild=is_guild)
+        if pair:
+            return pair, dm, is_guild
+
+    def get_dm_message(self, pair: MessagePair) -> discord.PartialMessage:
+        channel = self.bot.get_partial_messageable(pair.dm_channel_id, type=discord.ChannelType.private)
+        return channel.get_partial_message(pair.dm_message_id)
+
+    async def get_relayed_webhook(self, pair: MessagePair) -> discord.Webhook | None:
+        if not pair.webhook_id:
+            return None
+        manager = await self.get_manager()
+        webhook = manager.get(pair.webhook_id)
+        if not webhook:
+            log.warning("Webhook %s for relayed message %s is gone", pair.webhook_id, pair.thread_message_id)
+            return None
+        return webhook.webhook
+
+    async def get_burst(self, dm: DM, pair: MessagePair) -> Burst:
+        """Gets the coalesced message a pair is part of, rebuilding it from the DMs if it isn't cached."""
+        if pair.burst:
+            return pair.burst
+
+        records = await self.bot.pool.fetch(
+            "SELECT * FROM modmail_messages WHERE thread_message_id = $1 ORDER BY part", pair.thread_message_id
+        )
+        channel = self.bot.get_partial_messageable(pair.dm_channel_id, type=discord.ChannelType.private)
+        size_limit = self.forum_channel.guild.filesize_limit
+        parts: list[BurstPart] = []
+        errored: list[str] = []
+        for record in records:
+            try:
+                message = await channel.fetch_message(record["dm_message_id"])
+            except discord.NotFound:
+                if record["dm_message_id"] == pair.dm_message_id:
+                    parts.append(BurstPart(pair.dm_message_id, "", deleted=True))
+                continue
+            parts.append(BurstPart(message.id, message.content))
+            errored.extend(f"[{a.filename}](<{a.url}>)" for a in message.attachments if a.size >= size_limit)
+
+        footer = "\n"
+        if errored:
+            footer += f"\n-# Extra (too big) files: {', '.join(errored)}"
+        burst = Burst(parts, footer=footer)
+
+        for record in records:
+            sibling = dm.messages.get(record["dm_message_id"], from_guild=False)
+            if not sibling:
+                sibling = MessagePair.from_record(record)
+                dm.messages.add(sibling)
+            sibling.burst = burst
+        pair.burst = burst
+        return burst
 
     @commands.Cog.listener("on_raw_message_delete")
     async def delete_listener(self, data: discord.RawMessageDeleteEvent):
+        if not self.is_relevant(data.channel_id):
+            return
+
+        if not data.guild_id and (user_id := self.dm_channels.get(data.channel_id)):
+            pending = self.pending_bursts.get(user_id)
+            if pending:
+                pending.messages = [m for m in pending.messages if m.id != data.message_id]
 
         message_data = await self.find_thread_messages(data)
         if not message_data:
             return
 
-        dm_message, staff_message, dm, is_message_from_guild = message_data
-        dm.messages.remove((dm_message, staff_message))
+        pair, dm, is_message_from_guild = message_data
+        self.cancel_edit(pair.dm_message_id if is_message_from_guild else pair.thread_message_id)
+        burst = None
+        if not is_message_from_guild and pair.part is not None:
+            burst = await self.get_burst(dm, pair)
+        await self.forget_pair(dm, pair)
 
         if is_message_from_guild:
-            await dm_message.delete()
+            # Messages relayed from the user can't be deleted on their end.
+            if not pair.webhook_id:
+                await self.get_dm_message(pair).delete()
         else:
-            await staff_message.edit(
+            webhook = await self.get_relayed_webhook(pair)
+            if not webhook:
+                return
+            thread = discord.Object(pair.thread_id)
+            if burst:
+                part = burst.get(pair.dm_message_id)
+                if part:
+                    part.deleted = True
+                    if data.cached_message:
+                        part.content = data.cached_message.content
+                content, embeds = burst.render()
+                await webhook.edit_message(pair.thread_message_id, content=content or None, embeds=embeds, thread=thread)
+                return
+
+            if data.cached_message:
+                content = data.cached_message.content
+            else:
+                content = (await webhook.fetch_message(pair.thread_message_id, thread=thread)).content
+            await webhook.edit_message(
+                pair.thread_message_id,
                 content=None,
-                embed=discord.Embed(description=staff_message.content, color=discord.Color.red()).set_footer(
-                    text="deleted message"
-                ),
+                embed=discord.Embed(description=content, color=discord.Color.red()).set_footer(text="deleted message"),
+                thread=thread,
             )
 
     @commands.Cog.listener("on_raw_message_edit")
     async def update_listener(self, data: discord.RawMessageUpdateEvent):
-        if data.data.get("author", {}).get("bot"):
+        if not self.is_relevant(data.channel_id) or data.data.get("author", {}).get("bot"):
             return
 
         message_data = await self.find_thread_messages(data)
@@ -337,13 +1004,140 @@ class ModMail(commands.Cog):
         if not message_data:
             return
 
-        dm_message, staff_message, _, is_message_from_guild = message_data
+        pair, dm, is_message_from_guild = message_data
         content = data.data["content"]
 
         if is_message_from_guild:
-            await dm_message.edit(content=content)
+            return self.schedule_edit(pair.dm_message_id, partial(self.get_dm_message(pair).edit, content=content))
+
+        webhook = await self.get_relayed_webhook(pair)
+        if not webhook:
+            return
+        if pair.part is None:
+            edit = partial(webhook.edit_message, pair.thread_message_id, content=content, thread=discord.Object(pair.thread_id))
+            return self.schedule_edit(pair.thread_message_id, edit)
+
+        burst = await self.get_burst(dm, pair)
+        part = burst.get(pair.dm_message_id)
+        if part:
+            part.content = content
+        # Rendered when the edit goes out, so edits to several parts end up in one request.
+        self.schedule_edit(pair.thread_message_id, partial(self.edit_burst, webhook, pair, burst))
+
+    async def edit_burst(self, webhook: discord.Webhook, pair: MessagePair, burst: Burst) -> None:
+        content, embeds = burst.render()
+        await webhook.edit_message(
+            pair.thread_message_id, content=content or None, embeds=embeds, thread=discord.Object(pair.thread_id)
+        )
+
+    def schedule_edit(self, message_id: int, edit: Callable[[], Awaitable[Any]]) -> None:
+        """Debounces edits to a relayed message, only the latest one is sent once EDIT_DEBOUNCE has passed."""
+        pending = self.pending_edits.get(message_id)
+        if pending:
+            self.stats["edits_coalesced"] += 1
+            self.pending_edits[message_id] = (pending[0], edit)
+            return
+
+        timer = asyncio.get_running_loop().call_later(
+            EDIT_DEBOUNCE, lambda: self.spawn(self.flush_edit(message_id), name="modmail edit")
+        )
+        self.pending_edits[message_id] = (timer, edit)
+
+    def cancel_edit(self, message_id: int) -> None:
+        pending = self.pending_edits.pop(message_id, None)
+        if pending:
+            pending[0].cancel()
+            self.stats["edits_cancelled"] += 1
+
+    async def flush_edit(self, message_id: int) -> None:
+        pending = self.pending_edits.pop(message_id, None)
+        if pending:
+            self.stats["edits_sent"] += 1
+            await pending[1]()
+
+    @commands.Cog.listener("on_raw_thread_update")
+    async def thread_update_listener(self, payload: discord.RawThreadUpdateEvent):
+        if payload.parent_id != FORUM_CHANNEL_ID:
+            return
+        if payload.data.get("thread_metadata", {}).get("archived"):
+            await self.close_ticket(payload.thread_id)
+            await self.set_archived(payload.thread_id, True)
+            if payload.thread:
+                self.archived_threads[payload.thread_id] = payload.thread
+                while len(self.archived_threads) > ARCHIVED_THREAD_CACHE_SIZE:
+                    self.archived_threads.popitem(last=False)
         else:
-            await staff_message.edit(content=content)
+            self.archived_threads.pop(payload.thread_id, None)
+            await self.reopen_ticket(payload.thread_id)
+            await self.set_archived(payload.thread_id, False)
+
+    @commands.Cog.listener("on_raw_thread_delete")
+    async def thread_delete_listener(self, payload: discord.RawThreadDeleteEvent):
+        if payload.parent_id == FORUM_CHANNEL_ID:
+            await self.close_ticket(payload.thread_id)
+            await self.set_archived(payload.thread_id, True)
+            self.archived_threads.pop(payload.thread_id, None)
+
+    @commands.Cog.listener("on_ready")
+    async def sync_archived(self):
+        """Catches up on tickets archived or unarchived while the bot was disconnected."""
+        active = [thread.id for thread in self.forum_channel.threads if not thread.archived]
+        records = await self.bot.pool.fetch(
+            "UPDATE modmail SET archived = NOT archived "
+            "WHERE channel_id IS NOT NULL AND archived = (channel_id = ANY($1::bigint[])) RETURNING *",
+            active,
+        )
+        for record in records:
+            if record["archived"]:
+                await self.close_ticket(record["channel_id"])
+            else:
+                self.open_ticket(self.dms.load(record))
+        if records:
+            log.info("Caught up on %s modmail tickets archived or unarchived while disconnected", len(records))
+
+    @commands.command(name="modmailstats", hidden=True)
+    @commands.is_owner()
+    async def modmail_stats(self, ctx: commands.Context):
+        """Shows the modmail cache and relay counters."""
+        hits, misses = self.stats["prefilter_hits"], self.stats["prefilter_misses"]
+        lines = [
+            f"**Sessions:** {len(self.dms)} cached ({self.dms.memory_usage() / 1024:.1f} KiB), {self.dms.evicted} evicted, "
+            f"{len(self.active_channels)} watched channels",
+            f"**Raw event prefilter:** {hits} hits / {misses} misses ({hits / ((hits + misses) or 1):.1%} hit rate)",
+            f"**Coalescing:** {self.stats['coalesced_dms']} DMs merged into earlier ones, {len(self.pending_bursts)} bursts pending",
+            f"**Edits:** {self.stats['edits_sent']} sent, {self.stats['edits_coalesced']} coalesced, "
+            f"{self.stats['edits_cancelled']} cancelled by deletes, {len(self.pending_edits)} pending",
+        ]
+        stats = self.stats
+        lines.append(
+            f"**Thread resolution:** {stats['thread_cache_hits']} cached, {stats['archived_cache_hits']} archived cache hits, "
+            f"{stats['thread_fetches']} fetched, {stats['thread_unarchives']} unarchived, {stats['thread_creations']} created"
+        )
+        locks = self.user_locks
+        lines.append(
+            f"**User locks:** {len(locks)} in use, {locks.contended}/{locks.acquired} acquisitions contended, "
+            f"wait {locks.wait_total / (locks.contended or 1) * 1000:.0f}ms avg / {locks.wait_max * 1000:.0f}ms max"
+        )
+        downloader = self.downloader
+        lines.append(
+            f"**Attachments:** {downloader.downloaded} downloaded ({downloader.downloaded_bytes / 2**20:.1f} MiB, "
+            f"{downloader.spilled} spilled to disk) in {downloader.seconds:.1f}s, "
+            f"{downloader.budget.used / 2**20:.1f}/{downloader.budget.limit / 2**20:.0f} MiB budget in use"
+        )
+        if self.manager:
+            lines.append(f"**Webhook pool:** {len(self.manager.webhooks)} webhooks, {self.manager.rebalanced} rebalanced")
+            for webhook in self.manager.webhooks:
+                average = webhook.wait_total / (webhook.sent or 1)
+                limited = " (rate limited)" if webhook.is_rate_limited else ""
+                lines.append(
+                    f"**Webhook {webhook.webhook.id}{limited}:** {len(webhook.channel_ids)} tickets, "
+                    f"{webhook.queue_depth} queued in {webhook.active_threads} threads, "
+                    f"{webhook.sent} sent, wait {average * 1000:.0f}ms avg / {webhook.wait_max * 1000:.0f}ms max"
+                )
+        largest = sorted(self.dms.values(), key=DM.memory_usage, reverse=True)[:5]
+        if largest:
+            lines.append("**Largest sessions:** " + ", ".join(f"<@{dm.user_id}> {dm.memory_usage() / 1024:.1f} KiB" for dm in largest))
+        await ctx.send("\n".join(lines))
 
 
 async def setup(bot: commands.Bot):
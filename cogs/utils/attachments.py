@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import tempfile
+import time
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import List, Sequence, Tuple
+
+import aiohttp
+import discord
+
+__all__: Tuple[str, ...] = ('AttachmentDownloader', 'DownloadedFiles', 'AttachmentTiming')
+
+log = getLogger('TargetBot.attachments')
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ByteBudget:
+    """A semaphore counted in bytes. Requests bigger than the whole budget are
+    clamped to it, so they wait until nothing else is buffered instead of forever."""
+
+    __slots__: Tuple[str, ...] = ('limit', 'used', '_condition')
+
+    def __init__(self, limit: int) -> None:
+        self.limit: int = limit
+        self.used: int = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, size: int) -> int:
+        size = min(size, self.limit)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used + size <= self.limit)
+            self.used += size
+        return size
+
+    async def release(self, size: int) -> None:
+        async with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+@dataclass(slots=True)
+class AttachmentTiming:
+    filename: str
+    size: int
+    seconds: float
+    spilled: bool
+
+
+@dataclass
+class DownloadedFiles:
+    """The result of :meth:`AttachmentDownloader.download`.
+
+    Attributes
+    ----------
+    files: List[:class:`discord.File`]
+        The downloaded files, in the same order as the attachments.
+    failed: List[:class:`discord.Attachment`]
+        Attachments that were too big or could not be downloaded. They should be linked instead.
+    timings: List[:class:`AttachmentTiming`]
+        How long each successful download took.
+    """
+
+    files: List[discord.File] = field(default_factory=list)
+    failed: List[discord.Attachment] = field(default_factory=list)
+    timings: List[AttachmentTiming] = field(default_factory=list)
+    _buffers: List[io.BufferedIOBase] = field(default_factory=list, repr=False)
+    _reserved: int = field(default=0, repr=False)
+
+
+class _Download:
+    __slots__: Tuple[str, ...] = ('downloader', 'attachments', 'size_limit', 'result')
+
+    def __init__(self, downloader: AttachmentDownloader, attachments: Sequence[discord.Attachment], size_limit: int) -> None:
+        self.downloader = downloader
+        self.attachments = attachments
+        self.size_limit = size_limit
+        self.result = DownloadedFiles()
+
+    async def __aenter__(self) -> DownloadedFiles:
+        result = self.result
+        wanted = [a for a in self.attachments if a.size < self.size_limit]
+        # The whole message is reserved at once: reserving per attachment would let two
+        # messages each hold part of the budget while waiting on the rest of it.
+        result._reserved = await self.downloader.budget.acquire(sum(a.size for a in wanted))
+        try:
+            fetched = await asyncio.gather(*(self.downloader._fetch(a) for a in wanted), return_exceptions=True)
+        except BaseException:
+            await self.downloader.budget.release(result._reserved)
+            raise
+
+        fetched_iter = iter(fetched)
+        for attachment in self.attachments:
+            if attachment.size >= self.size_limit:
+                result.failed.append(attachment)
+                continue
+
+            item = next(fetched_iter)
+            if isinstance(item, BaseException):
+                log.warning('Could not download attachment %s', attachment.url, exc_info=item)
+                result.failed.append(attachment)
+                continue
+
+            buffer, timing = item
+            result._buffers.append(buffer)
+            result.timings.append(timing)
+            result.files.append(
+                discord.File(
+                    buffer,
+                    filename=attachment.filename,
+                    spoiler=attachment.is_spoiler(),
+                    description=attachment.description,
+                )
+            )
+        return result
+
+    async def __aexit__(self, *args) -> None:
+        for buffer in self.result._buffers:
+            buffer.close()
+        if self.result._reserved:
+            await self.downloader.budget.release(self.result._reserved)
+
+
+class AttachmentDownloader:
+    """Downloads attachments concurrently while bounding how many bytes are held at once.
+
+    Files up to ``spill_threshold`` bytes are kept in memory, bigger ones are streamed
+    to a temporary file. The bytes stay reserved until the :meth:`download` context
+    is exited, which is when the files have been sent.
+
+    .. code-block:: python3
+
+        async with downloader.download(message.attachments, size_limit=guild.filesize_limit) as downloaded:
+            await channel.send(files=downloaded.files)
+
+    Attributes
+    ----------
+    session: :class:`aiohttp.ClientSession`
+        The session used to download.
+    budget: :class:`ByteBudget`
+        The global byte budget shared by every download.
+    spill_threshold: :class:`int`
+        The size above which attachments are written to a temporary file.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        *,
+        budget: int = 64 * 1024 * 1024,
+        spill_threshold: int = 8 * 1024 * 1024,
+    ) -> None:
+        self.session: aiohttp.ClientSession = session
+        self.budget: ByteBudget = ByteBudget(budget)
+        self.spill_threshold: int = spill_threshold
+        self.downloaded: int = 0
+        self.downloaded_bytes: int = 0
+        self.spilled: int = 0
+        self.seconds: float = 0.0
+
+    def download(self, attachments: Sequence[discord.Attachment], *, size_limit: int) -> _Download:
+        """Returns an async context manager that downloads ``attachments`` into a :class:`DownloadedFiles`.
+
+        Parameters
+        ----------
+        attachments: Sequence[:class:`discord.Attachment`]
+            The attachments to download.
+        size_limit: :class:`int`
+            Attachments of this size or bigger are not downloaded and are reported as failed.
+        """
+        return _Download(self, attachments, size_limit)
+
+    async def _fetch(self, attachment: discord.Attachment) -> tuple[io.BufferedIOBase, AttachmentTiming]:
+        spilled = attachment.size > self.spill_threshold
+        buffer: io.BufferedIOBase = tempfile.TemporaryFile() if spilled else io.BytesIO()
+        started = time.perf_counter()
+        try:
+            async with self.session.get(attachment.url) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    buffer.write(chunk)
+        except BaseException:
+            buffer.close()
+            raise
+
+        buffer.seek(0)
+        timing = AttachmentTiming(attachment.filename, attachment.size, time.perf_counter() - started, spilled)
+        log.debug('Downloaded %s (%s bytes, spilled=%s) in %.3fs', timing.filename, timing.size, spilled, timing.seconds)
+        self.downloaded += 1
+        self.downloaded_bytes += attachment.size
+        self.spilled += spilled
+        self.seconds += timing.seconds
+        return buffer, timing
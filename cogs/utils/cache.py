@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Tuple, TypeVar
+
+__all__: Tuple[str, ...] = ('ExpiringSet',)
+
+K = TypeVar('K', bound=Hashable)
+
+
+class ExpiringSet(Generic[K]):
+    """A bounded set whose entries are forgotten ``ttl`` seconds after being added.
+
+    Attributes
+    ----------
+    ttl: :class:`float`
+        How long, in seconds, an entry is kept.
+    maxsize: :class:`int`
+        The maximum amount of entries, the oldest ones are dropped first.
+    """
+
+    __slots__: Tuple[str, ...] = ('ttl', 'maxsize', '_entries')
+
+    def __init__(self, *, ttl: float, maxsize: int = 1024) -> None:
+        self.ttl: float = ttl
+        self.maxsize: int = maxsize
+        self._entries: OrderedDict[K, float] = OrderedDict()
+
+    def _purge(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            key, expires = next(iter(entries.items()))
+            if expires > now and len(entries) <= self.maxsize:
+                break
+            del entries[key]
+
+    def __contains__(self, key: K) -> bool:
+        expires = self._entries.get(key)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return False
+        return True
+
+    def __len__(self) -> int:
+        self._purge(time.monotonic())
+        return len(self._entries)
+
+    def add(self, key: K) -> None:
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        self._entries[key] = now + self.ttl
+        self._purge(now)
+
+    def discard(self, key: K) -> None:
+        self._entries.pop(key, None)
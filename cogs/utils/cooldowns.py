@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Generic, Hashable, Tuple, TypeVar
+
+__all__: Tuple[str, ...] = ('SlidingWindow',)
+
+K = TypeVar('K', bound=Hashable)
+
+
+class SlidingWindow(Generic[K]):
+    """Allows at most ``rate`` hits per key within any ``per`` seconds.
+
+    Unlike a fixed bucket, the window moves with every hit, so a burst right
+    after a reset is not let through twice. Only the hits still inside the window
+    are kept, and the least recently used keys are dropped past ``maxsize``.
+
+    Attributes
+    ----------
+    maxsize: :class:`int`
+        The maximum amount of keys tracked.
+    allowed: :class:`int`
+        How many hits were let through.
+    suppressed: :class:`int`
+        How many hits were over the rate.
+    """
+
+    __slots__: Tuple[str, ...] = ('maxsize', 'allowed', 'suppressed', '_hits')
+
+    def __init__(self, *, maxsize: int = 4096) -> None:
+        self.maxsize: int = maxsize
+        self.allowed: int = 0
+        self.suppressed: int = 0
+        self._hits: OrderedDict[K, Deque[float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._hits)
+
+    def hit(self, key: K, *, rate: int, per: float) -> bool:
+        """Records a hit for ``key`` if it's within the rate.
+
+        Returns
+        -------
+            Whether the hit was allowed.
+        """
+        now = time.monotonic()
+        hits = self._hits.pop(key, None) or deque()
+        while hits and hits[0] <= now - per:
+            hits.popleft()
+
+        allowed = len(hits) < rate
+        if allowed:
+            hits.append(now)
+            self.allowed += 1
+        else:
+            self.suppressed += 1
+
+        if hits:
+            self._hits[key] = hits
+            while len(self._hits) > self.maxsize:
+                self._hits.popitem(last=False)
+        return allowed
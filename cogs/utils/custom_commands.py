@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any
+import bisect
+import heapq
+import itertools
+from typing import TYPE_CHECKING, Any, Callable, Generator
 
 import discord
 from discord.ext import commands
+from discord.http import MultipartParameters, handle_message_parameters
 from logging import getLogger
 
 if TYPE_CHECKING:
@@ -17,16 +21,188 @@ class HandlerContext(commands.Context['TargetBot']):
 
 
 async def command_callback(ctx: HandlerContext):
-    await ctx.send(content=ctx.command.content, embed=ctx.command.embed)
+    if await ctx.bot.check_custom_cooldown(ctx.command, ctx.message):
+        await ctx.send(content=ctx.command.content, embed=ctx.command.embed)
 
 
 class HandlerCommand(commands.Command[Any, ..., Any]):
     def __init__(
-        self, *, name: str, aliases: list[str], content: str | None, embed: dict | None, description: str | None
+        self,
+        *,
+        name: str,
+        aliases: list[str],
+        content: str | None,
+        embed: dict | None,
+        description: str | None,
+        cooldown_rate: int | None = None,
+        cooldown_per: float | None = None,
+        checksum: str | None = None,
     ) -> None:
         super().__init__(command_callback, aliases=aliases, name=name, brief=description)  # type: ignore
         self.content = content
+        self.raw_embed = embed
+        # (rate, per) answers per channel, or None for the bot's default.
+        # Not `cooldown`, that's a read-only property of commands.Command.
+        self.cc_cooldown: tuple[int, float] | None = None
+        if cooldown_rate is not None:
+            self.cc_cooldown = (cooldown_rate, cooldown_per or 0.0)
+        # md5 of the database row, used to tell whether a snapshot is stale.
+        self.checksum = checksum
+        self._payload: MultipartParameters | None = None
         if embed:
             self.embed: discord.Embed | None = discord.Embed.from_dict(embed)
         else:
             self.embed = None
+
+    def payload(self, allowed_mentions: discord.AllowedMentions | None) -> MultipartParameters:
+        """The message this command sends, serialized once and reused by the fast path.
+
+        It has no files, so it can be sent any number of times.
+
+        Parameters
+        ----------
+        allowed_mentions: Optional[:class:`discord.AllowedMentions`]
+            The bot's default allowed mentions.
+        """
+        if self._payload is None:
+            self._payload = handle_message_parameters(
+                content=self.content, embed=self.embed, previous_allowed_mentions=allowed_mentions
+            )
+        return self._payload
+
+    def to_row(self) -> dict[str, Any]:
+        """The command as a :attr:`TargetBot.CC_QUERY` row, for :class:`CommandSnapshot`."""
+        return {
+            'command_string': self.name,
+            'command_content': self.content,
+            'embed': self.raw_embed,
+            'aliases': list(self.aliases),
+            'description': self.brief,
+            'cooldown_rate': self.cc_cooldown and self.cc_cooldown[0],
+            'cooldown_per': self.cc_cooldown and self.cc_cooldown[1],
+            'checksum': self.checksum,
+        }
+
+
+def _trigrams(text: str) -> set[str]:
+    # Same padding as pg_trgm, so scores are close to what SIMILARITY() gave.
+    padded = f'  {text.lower()} '
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class CommandIndex:
+    """An in-memory trigram and prefix index over custom command names and aliases.
+
+    It backs the ``/customcommand`` autocompletes, which used to run a ``SIMILARITY()``
+    query on every keystroke. It's kept up to date by :meth:`TargetBot.add_command`
+    and :meth:`TargetBot.remove_command`. Lookups are case insensitive, but names are
+    returned as they were added.
+    """
+
+    __slots__ = ('_names', '_aliases', '_sorted', '_trigrams', '_postings')
+
+    def __init__(self) -> None:
+        self._names: dict[str, str] = {}  # lowercased -> original name
+        self._aliases: set[str] = set()
+        self._sorted: list[str] = []
+        self._trigrams: dict[str, set[str]] = {}
+        self._postings: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._names
+
+    def add(self, name: str, *, alias: bool = False) -> None:
+        key = name.lower()
+        if alias:
+            self._aliases.add(key)
+        else:
+            self._aliases.discard(key)
+        if key in self._names:
+            self._names[key] = name
+            return
+
+        self._names[key] = name
+        bisect.insort(self._sorted, key)
+        self._trigrams[key] = grams = _trigrams(key)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, name: str) -> None:
+        key = name.lower()
+        if self._names.pop(key, None) is None:
+            return
+        self._aliases.discard(key)
+        del self._sorted[bisect.bisect_left(self._sorted, key)]
+        for gram in self._trigrams.pop(key):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def add_command(self, command: HandlerCommand) -> None:
+        self.add(command.name)
+        for alias in command.aliases:
+            self.add(alias, alias=True)
+
+    def remove_command(self, command: HandlerCommand) -> None:
+        self.remove(command.name)
+        for alias in command.aliases:
+            self.remove(alias)
+
+    def _prefixed(self, prefix: str) -> Generator[str, None, None]:
+        for key in itertools.islice(self._sorted, bisect.bisect_left(self._sorted, prefix), None):
+            if not key.startswith(prefix):
+                break
+            yield key
+
+    def search(self, query: str, *, limit: int = 25, aliases: bool = True) -> list[str]:
+        """Returns up to ``limit`` names matching ``query``, best matches first.
+
+        Names starting with the query come first. Then, for queries of three or more
+        characters, names sharing enough trigrams with it, ranked by similarity like
+        ``pg_trgm`` does. Shorter queries are filled with names that contain them.
+
+        Parameters
+        ----------
+        query: :class:`str`
+            What the user typed so far.
+        limit: :class:`int`
+            The maximum amount of names to return.
+        aliases: :class:`bool`
+            Whether aliases can be returned, or only command names.
+        """
+        query = query.strip().lower()
+
+        def allowed(key: str) -> bool:
+            return aliases or key not in self._aliases
+
+        keys = list(itertools.islice(filter(allowed, self._prefixed(query)), limit))
+        if len(keys) < limit:
+            seen = set(keys)
+            if len(query) < 3:
+                extra = (k for k in self._sorted if query in k and k not in seen and allowed(k))
+                keys.extend(itertools.islice(extra, limit - len(keys)))
+            else:
+                keys.extend(self._similar(query, limit - len(keys), lambda k: k not in seen and allowed(k)))
+
+        return [self._names[key] for key in keys]
+
+    def _similar(self, query: str, limit: int, predicate: Callable[[str], bool]) -> list[str]:
+        grams = _trigrams(query)
+        shared: dict[str, int] = {}
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+
+        scored = []
+        for key, count in shared.items():
+            if not predicate(key):
+                continue
+            similarity = count / (len(grams) + len(self._trigrams[key]) - count)
+            if similarity > 0.1:
+                scored.append((similarity, key))
+
+        return [key for _, key in heapq.nlargest(limit, scored)]
@@ -4,10 +4,13 @@ import sys
 
 import asyncio
 import datetime
+import hashlib
 import os
+import time
 import traceback
 from logging import getLogger
-from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional, Tuple, TypedDict
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Any, Counter, Deque, Dict, Generator, List, Optional, Set, Tuple, TypedDict
 
 import discord
 from discord import app_commands
@@ -18,11 +21,15 @@ if TYPE_CHECKING:
     from main import TargetBot as BotClass
 
 
-__all__: Tuple[str, ...] = ('ExceptionsManager', )
+__all__: Tuple[str, ...] = ('ExceptionsManager', 'ErrorRecord', 'TokenBucket', 'fingerprint')
 
 load_dotenv()
 
 ERROR_WEBHOOK_URL = os.environ['ERROR_WEBHOOK']
+# In seconds. When set, errors are sent as one digest per interval instead of one by one.
+ERROR_DIGEST_INTERVAL = os.environ.get('ERROR_DIGEST_INTERVAL')
+ERROR_COLUMNS = ('fingerprint', 'traceback', 'command', 'guild_id', 'channel_id', 'author_id', 'occurred_at')
+PRUNE_INTERVAL = 3600.0
 log = getLogger('ErrorManager')
 
 class TracebackTypeOptional(TypedDict, total=False):
@@ -31,56 +38,245 @@ class TracebackTypeOptional(TypedDict, total=False):
     channel: int
     event_name: str
     command: Optional[commands.Command[Any, ..., Any] | app_commands.Command[Any, ..., Any] | app_commands.ContextMenu]
+    # How many occurrences a report covers, the ones suppressed since the last one included.
+    occurrences: int
 
 
 class TracebackType(TracebackTypeOptional):
     time: datetime.datetime
     exception: Exception
 
+
+def _normalize_path(filename: str) -> str:
+    filename = filename.replace(os.getcwd(), 'CWD')
+    # Installed packages look the same whatever the environment they're in.
+    _, sep, rest = filename.rpartition('site-packages' + os.sep)
+    return rest if sep else filename
+
+
+def fingerprint(error: BaseException) -> str:
+    """Identifies an error by its type and the functions it went through.
+
+    Line numbers are left out, so unrelated edits to a file don't split an error
+    into a new fingerprint.
+    """
+    parts = [f'{type(error).__module__}.{type(error).__qualname__}']
+    parts.extend(f'{_normalize_path(frame.filename)}:{frame.name}' for frame in traceback.extract_tb(error.__traceback__))
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()[:16]
+
+
+class ErrorRecord:
+    """Everything known about one :func:`fingerprint`.
+
+    Attributes
+    ----------
+    fingerprint: :class:`str`
+        The fingerprint.
+    traceback: :class:`str`
+        The most recently reported traceback.
+    count: :class:`int`
+        How many times it happened.
+    first_seen: :class:`datetime.datetime`
+        When it first happened.
+    last_seen: :class:`datetime.datetime`
+        When it last happened.
+    last_reported: Optional[:class:`datetime.datetime`]
+        When it was last sent to the webhook.
+    unreported: :class:`int`
+        Occurrences since then that were only counted.
+    recent: Deque[:class:`dict`]
+        The packets of the latest occurrences, without the exception so its frames can be freed.
+    kind: :class:`str`
+        The name of the exception type.
+    pending: :class:`int`
+        Occurrences since the last digest.
+    sources: Set[:class:`str`]
+        The commands and events it happened in since the last digest.
+    guilds: Set[:class:`int`]
+        The IDs of the guilds it happened in since the last digest.
+    """
+
+    __slots__: Tuple[str, ...] = (
+        'fingerprint',
+        'traceback',
+        'count',
+        'first_seen',
+        'last_seen',
+        'last_reported',
+        'unreported',
+        'recent',
+        'kind',
+        'pending',
+        'sources',
+        'guilds',
+    )
+
+    def __init__(self, fingerprint: str, *, kind: str, time: datetime.datetime, ring_size: int) -> None:
+        self.fingerprint: str = fingerprint
+        self.traceback: str = ''
+        self.count: int = 0
+        self.first_seen: datetime.datetime = time
+        self.last_seen: datetime.datetime = time
+        self.last_reported: Optional[datetime.datetime] = None
+        self.unreported: int = 0
+        self.recent: Deque[TracebackTypeOptional] = deque(maxlen=ring_size)
+        self.kind: str = kind
+        self.pending: int = 0
+        self.sources: Set[str] = set()
+        self.guilds: Set[int] = set()
+
+    def add(self, packet: TracebackType) -> None:
+        self.count += 1
+        self.last_seen = packet['time']
+        self.recent.append({k: v for k, v in packet.items() if k != 'exception'})  # type: ignore
+
+        self.pending += 1
+        command = packet.get('command')
+        self.sources.add(command.qualified_name if command else packet.get('event_name') or 'unknown')
+        if guild := packet.get('guild'):
+            self.guilds.add(guild)
+
+    def reset_pending(self) -> None:
+        self.pending = 0
+        self.sources.clear()
+        self.guilds.clear()
+
+
+class TokenBucket:
+    """Allows bursts of up to ``capacity`` actions, refilled at ``rate`` per second."""
+
+    __slots__: Tuple[str, ...] = ('capacity', 'rate', '_tokens', '_updated')
+
+    def __init__(self, *, capacity: int, rate: float) -> None:
+        self.capacity: int = capacity
+        self.rate: float = rate
+        self._tokens: float = capacity
+        self._updated: float = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
 class ExceptionsManager:
     """A simple exception handler that sends all exceptions to a error
     Webhook and then logs them to the console.
 
-    This class handles cooldowns with a simple lock, so you dont have to worry about
-    rate limiting your webhook and getting banned :).
+    :meth:`add_error` only queues the error. A single background task sends them,
+    packing the embeds of several errors into each webhook message, under a token
+    bucket so you dont have to worry about rate limiting your webhook and getting banned :).
 
     .. note::
 
         If some code is raising MANY errors VERY fast and you're not there to fix it,
-        this will take care of things for you.
+        this will take care of things for you. Once the queue is full, errors are
+        dropped and summarized in a single message when it drains.
 
     Attributes
     ----------
     bot: :class:`BotClass`
         The bot instance.
-    cooldown: :class:`datetime.timedelta`
-        The cooldown between sending errors. This defaults to 5 seconds.
-    errors: Dict[str, Dict[str, Any]]
-        A mapping of tracbacks to their error information.
+    bucket: :class:`TokenBucket`
+        The rate limit for webhook messages. Defaults to bursts of 5, then one every 2 seconds.
+    errors: OrderedDict[str, :class:`ErrorRecord`]
+        A mapping of fingerprints to their error information, the least recently seen first.
+        Only the last ``max_fingerprints`` are kept.
+    repeat_window: :class:`datetime.timedelta`
+        A fingerprint already reported within this window is only counted, not sent again.
+    digest_interval: Optional[:class:`datetime.timedelta`]
+        If set, errors are not sent as they happen. Once per interval, a single digest lists
+        every fingerprint seen with its count, commands and guilds, with the full traceback
+        only for fingerprints that were never reported. Defaults to ``ERROR_DIGEST_INTERVAL``.
+    dropped: :class:`int`
+        How many errors were dropped because the queue was full.
+    persist: :class:`bool`
+        Whether every occurrence is also written to the ``errors`` table. Rows are buffered
+        and written in one COPY every ``flush_interval`` seconds, so this never waits on the database.
+    retention: :class:`datetime.timedelta`
+        Rows older than this are pruned, checked every hour. Defaults to 30 days.
+    unpersisted: :class:`int`
+        How many occurrences could not be written, because the buffer was full or the write failed.
     code_blocker: :class:`str`
         The code blocker used to format Discord codeblocks.
     error_webhook: :class:`discord.Webhook`
         The error webhook used to send errors.
     """
 
-    __slots__: Tuple[str, ...] = ('bot', 'cooldown', '_lock', '_most_recent', 'errors', 'code_blocker', 'error_webhook')
+    __slots__: Tuple[str, ...] = (
+        'bot',
+        'bucket',
+        'errors',
+        'max_fingerprints',
+        'ring_size',
+        'repeat_window',
+        'digest_interval',
+        'dropped',
+        'code_blocker',
+        'error_webhook',
+        '_queue',
+        '_consumer',
+        '_digester',
+        'persist',
+        'flush_interval',
+        'retention',
+        'unpersisted',
+        '_rows',
+        '_flusher',
+        '_dropped_types',
+    )
 
     async def on_error(self, event_name: str, *event_args, **event_kwargs):
         _, error, _ = sys.exc_info()
         if isinstance(error, Exception):
             await self.add_error(error=error, ctx=event_name)
 
-    def __init__(self, bot: BotClass, *, cooldown: datetime.timedelta = datetime.timedelta(seconds=5), hijack_error_event: bool = True) -> None:
+    def __init__(
+        self,
+        bot: BotClass,
+        *,
+        bucket: Optional[TokenBucket] = None,
+        max_queued: int = 100,
+        max_fingerprints: int = 200,
+        ring_size: int = 10,
+        repeat_window: datetime.timedelta = datetime.timedelta(minutes=10),
+        digest_interval: Optional[datetime.timedelta] = None,
+        persist: bool = True,
+        flush_interval: float = 5.0,
+        retention: datetime.timedelta = datetime.timedelta(days=30),
+        max_buffered: int = 5000,
+        hijack_error_event: bool = True,
+    ) -> None:
         if not ERROR_WEBHOOK_URL:
             raise RuntimeError('No error webhook set in .env!')
 
         self.bot: BotClass = bot
-        self.cooldown: datetime.timedelta = cooldown
-
-        self._lock: asyncio.Lock = asyncio.Lock()
-        self._most_recent: Optional[datetime.datetime] = None
-
-        self.errors: Dict[str, List[TracebackType]] = {}
+        self.bucket: TokenBucket = bucket or TokenBucket(capacity=5, rate=0.5)
+
+        self._queue: asyncio.Queue[Tuple[ErrorRecord, TracebackType]] = asyncio.Queue(max_queued)
+        self._consumer: Optional[asyncio.Task[None]] = None
+        self._dropped_types: Counter[str] = Counter()
+        self.dropped: int = 0
+
+        self.errors: OrderedDict[str, ErrorRecord] = OrderedDict()
+        self.max_fingerprints: int = max_fingerprints
+        self.ring_size: int = ring_size
+        self.repeat_window: datetime.timedelta = repeat_window
+        if digest_interval is None and ERROR_DIGEST_INTERVAL:
+            digest_interval = datetime.timedelta(seconds=float(ERROR_DIGEST_INTERVAL))
+        self.digest_interval: Optional[datetime.timedelta] = digest_interval
+        self._digester: Optional[asyncio.Task[None]] = None
+        self.persist: bool = persist
+        self.flush_interval: float = flush_interval
+        self.retention: datetime.timedelta = retention
+        self.unpersisted: int = 0
+        self._rows: Deque[Tuple[Any, ...]] = deque(maxlen=max_buffered)
+        self._flusher: Optional[asyncio.Task[None]] = None
         self.code_blocker: str = '```py\n{}```'
         self.error_webhook: discord.Webhook = discord.Webhook.from_url(
             ERROR_WEBHOOK_URL, session=bot.session, bot_token=bot.http.token
@@ -94,27 +290,34 @@ class ExceptionsManager:
         for i in range(0, len(iterable), chunksize - cbs):
             yield self.code_blocker.format(iterable[i : i + chunksize - cbs])
 
-    async def release_error(self, traceback: str, packet: TracebackType) -> None:
-        """|coro|
+    def _format_traceback(self, error: Exception) -> str:
+        return ''.join(traceback.format_exception(type(error), error, error.__traceback__)).replace(os.getcwd(), 'CWD')
+
+    def _author(self, embed: discord.Embed) -> discord.Embed:
+        if self.bot.user:
+            embed.set_author(name=str(self.bot.user), icon_url=self.bot.user.display_avatar.url)
+        return embed
 
-        Releases an error to the webhook and logs it to the console. It is not recommended
-        to call this yourself, call :meth:`add_error` instead.
+    def render_error(self, record: ErrorRecord, packet: TracebackType) -> List[discord.Embed]:
+        """Builds the embeds that report an error: its metadata, then its traceback
+        split into code blocks. It is not recommended to call this yourself, call
+        :meth:`add_error` instead.
 
         Parameters
         ----------
-        traceback: :class:`str`
-            The traceback of the error.
+        record: :class:`ErrorRecord`
+            The fingerprint of the error, with its traceback.
         packet: :class:`dict`
             The additional information about the error.
         """
-        log.error('Releasing error to log', exc_info=packet['exception'])
-
-        if self.error_webhook.is_partial():
-            self.error_webhook = await self.error_webhook.fetch()
-
         fmt = {
             'time': discord.utils.format_dt(packet['time']),
+            'fingerprint': f'`{record.fingerprint}`',
+            'seen': f'{record.count} times since {discord.utils.format_dt(record.first_seen, "R")}',
         }
+        if (occurrences := packet.get('occurrences', 1)) > 1:
+            fmt['since last report'] = f'{occurrences} times'
+
         if author := packet.get('author'):
             fmt['author'] = f'<@{author}>'
 
@@ -155,44 +358,213 @@ class ExceptionsManager:
             value='\n'.join([f'**{k.title()}**: {v}' for k, v in fmt.items()]),
         )
 
+        code_chunks = list(self._yield_code_chunks(record.traceback))
+        embed.description = code_chunks.pop(0)
+        embeds = [self._author(embed)]
+        embeds.extend(self._author(discord.Embed(description=entry)) for entry in code_chunks)
+        return embeds
+
+    def _pack(self, embeds: List[discord.Embed]) -> Generator[List[discord.Embed], None, None]:
+        # A message holds up to 10 embeds and 6000 characters across all of them.
+        message: List[discord.Embed] = []
+        size = 0
+        for embed in embeds:
+            if message and (len(message) == 10 or size + len(embed) > 6000):
+                yield message
+                message, size = [], 0
+            message.append(embed)
+            size += len(embed)
+        if message:
+            yield message
+
+    def _drain(self, first: Tuple[ErrorRecord, TracebackType]) -> Tuple[List[discord.Embed], int]:
+        items = [first]
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+
+        embeds: List[discord.Embed] = []
+        for record, packet in items:
+            log.error('Releasing error to log', exc_info=packet['exception'])
+            try:
+                embeds.extend(self.render_error(record, packet))
+            except Exception as e:
+                log.error('Could not render error', exc_info=e)
+
+        if self.dropped:
+            lines = [f'`{name}` x{count}' for name, count in self._dropped_types.most_common(20)]
+            summary = discord.Embed(
+                title=f'{self.dropped} errors were dropped, the queue was full',
+                description='\n'.join(lines),
+                colour=discord.Colour.red(),
+            )
+            embeds.append(self._author(summary))
+            self.dropped = 0
+            self._dropped_types.clear()
+        return embeds, len(items)
+
+    async def _send(self, embeds: List[discord.Embed]) -> None:
         kwargs: Dict[str, Any] = {}
         if self.bot.user:
             kwargs['username'] = self.bot.user.display_name
             kwargs['avatar_url'] = self.bot.user.display_avatar.url
 
-            embed.set_author(name=str(self.bot.user), icon_url=self.bot.user.display_avatar.url)
-
-        webhook = self.error_webhook
-        if webhook.is_partial():
-            self.error_webhook = webhook = await self.error_webhook.fetch()
-
-        code_chunks = list(self._yield_code_chunks(traceback))
-
-        embed.description = code_chunks.pop(0)
-        await webhook.send(embed=embed, **kwargs)
-
+        for message in self._pack(embeds):
+            await self.bucket.acquire()
+            try:
+                webhook = self.error_webhook
+                if webhook.is_partial():
+                    self.error_webhook = webhook = await self.error_webhook.fetch()
+                await webhook.send(embeds=message, **kwargs)
+            except Exception as e:
+                # Not through add_error, a broken webhook would feed itself.
+                log.error('Could not send errors to the webhook', exc_info=e)
+
+    async def _consume(self) -> None:
+        while True:
+            embeds, taken = self._drain(await self._queue.get())
+            await self._send(embeds)
+            for _ in range(taken):
+                self._queue.task_done()
+
+    def render_digest(self) -> List[discord.Embed]:
+        """Builds the digest of the errors since the last one, and marks them as reported.
+
+        Returns
+        -------
+            The summary embeds followed by the tracebacks of new fingerprints, or an
+            empty list if nothing happened.
+        """
+        records = sorted((r for r in self.errors.values() if r.pending), key=lambda r: r.pending, reverse=True)
+        if not records:
+            return []
+
+        now = discord.utils.utcnow()
+        lines: List[str] = []
+        new: List[ErrorRecord] = []
+        for record in records:
+            guilds = [g.name if (g := self.bot.get_guild(i)) else str(i) for i in record.guilds]
+            sources = sorted(record.sources)
+            line = f'`{record.fingerprint}` **{record.kind}** x{record.pending} ({record.count} total)'
+            if record.last_reported is None:
+                line = f'**New** {line}'
+                new.append(record)
+            line += f'\nin {", ".join(sources[:5])}{"..." if len(sources) > 5 else ""}'
+            if guilds:
+                line += f' | guilds: {", ".join(guilds[:5])}{"..." if len(guilds) > 5 else ""}'
+            lines.append(line)
+
+        total = sum(r.pending for r in records)
+        title = f'Error digest: {total} errors, {len(records)} fingerprints'
         embeds: List[discord.Embed] = []
-        for entry in code_chunks:
-            embed = discord.Embed(description=entry)
-            if self.bot.user:
-                embed.set_author(name=str(self.bot.user), icon_url=self.bot.user.display_avatar.url)
-
-            embeds.append(embed)
-
-            if len(embeds) == 10:
-                await webhook.send(embeds=embeds, **kwargs)
-                embeds = []
-
-        if embeds:
-            await webhook.send(embeds=embeds, **kwargs)
+        description = ''
+        for line in lines:
+            if description and len(description) + len(line) + 1 > 4000:
+                embeds.append(discord.Embed(title=title, description=description, timestamp=now))
+                description = ''
+            description = f'{description}\n{line}' if description else line
+        embeds.append(discord.Embed(title=title, description=description, timestamp=now))
+        embeds = [self._author(embed) for embed in embeds]
+
+        for record in new:
+            packet: TracebackType = {**record.recent[-1], 'occurrences': record.pending}  # type: ignore
+            embeds.extend(self.render_error(record, packet))
+        for record in records:
+            record.last_reported = now
+            record.reset_pending()
+        return embeds
+
+    async def _digest(self) -> None:
+        assert self.digest_interval is not None
+        while True:
+            await asyncio.sleep(self.digest_interval.total_seconds())
+            await self._send(self.render_digest())
+
+    def _persist(self, record: ErrorRecord, packet: TracebackType) -> None:
+        if not self.persist:
+            return
+        if len(self._rows) == self._rows.maxlen:
+            self.unpersisted += 1  # the oldest row is pushed out
+        command = packet.get('command')
+        self._rows.append(
+            (
+                record.fingerprint,
+                record.traceback,
+                command.qualified_name if command else packet.get('event_name'),
+                packet.get('guild'),
+                packet.get('channel') or None,
+                packet.get('author'),
+                packet['time'],
+            )
+        )
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def flush(self) -> None:
+        """|coro| Writes the buffered occurrences to the ``errors`` table, with a single COPY."""
+        if not self._rows:
+            return
+        rows = list(self._rows)
+        self._rows.clear()
+        try:
+            await self.bot.pool.copy_records_to_table('errors', records=rows, columns=ERROR_COLUMNS)
+        except Exception as e:
+            # Not through add_error, a broken database would feed itself.
+            self.unpersisted += len(rows)
+            log.error('Could not write %s errors to the database', len(rows), exc_info=e)
+
+    async def prune(self) -> None:
+        """|coro| Deletes the occurrences older than :attr:`retention`."""
+        try:
+            status = await self.bot.pool.execute('DELETE FROM errors WHERE occurred_at < NOW() - $1::interval', self.retention)
+        except Exception as e:
+            log.error('Could not prune old errors', exc_info=e)
+        else:
+            log.debug('Pruned old errors: %s', status)
+
+    async def _flush_loop(self) -> None:
+        last_prune = 0.0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                last_prune = time.monotonic()
+                await self.prune()
+
+    async def close(self, *, timeout: float = 5.0) -> None:
+        """|coro| Gives the queued errors ``timeout`` seconds to be sent and written, then stops the background tasks."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+            try:
+                await asyncio.wait_for(self.flush(), timeout)
+            except asyncio.TimeoutError:
+                log.warning('Could not write the last errors to the database in time')
+
+        if self._digester is not None:
+            self._digester.cancel()
+            self._digester = None
+            try:
+                await asyncio.wait_for(self._send(self.render_digest()), timeout)
+            except asyncio.TimeoutError:
+                log.warning('Could not send the last error digest in time')
+
+        if self._consumer is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning('Dropping %s queued errors on close', self._queue.qsize())
+        self._consumer.cancel()
+        self._consumer = None
 
     async def add_error(
         self, *, error: Exception, ctx: Optional[commands.Context[BotClass] | discord.Interaction[BotClass] | str] = None
     ) -> None:
         """|coro|
 
-        Add an error to the error manager. This will handle all cooldowns and internal cache management
-        for you. This is the recommended way to add errors.
+        Add an error to the error manager. This only queues the error and returns
+        right away, the cooldowns and internal cache management are handled for you.
+        This is the recommended way to add errors.
 
         Parameters
         ----------
@@ -219,39 +591,51 @@ class ExceptionsManager:
         elif ctx is not None:
             addons: TracebackTypeOptional = {
                 'command': ctx.command,
-                'author': getattr(ctx, 'user', ctx.author),  # type: ignore
+                'author': (ctx.user if isinstance(ctx, discord.Interaction) else ctx.author).id,
                 'guild': (ctx.guild and ctx.guild.id) or None,
                 'channel': ctx.channel.id if ctx.channel else 0,
             }
             packet.update(addons)  # type: ignore
 
-        traceback_string = ''.join(traceback.format_exception(type(error), error, error.__traceback__)).replace(
-            os.getcwd(), 'CWD'
+        key = fingerprint(error)
+        record = self.errors.pop(key, None)
+        if record is None:
+            record = ErrorRecord(key, kind=type(error).__name__, time=packet['time'], ring_size=self.ring_size)
+        self.errors[key] = record
+        while len(self.errors) > self.max_fingerprints:
+            self.errors.popitem(last=False)
+        record.add(packet)
+
+        digest = self.digest_interval is not None
+        suppressed = (
+            not digest and record.last_reported is not None and packet['time'] - record.last_reported < self.repeat_window
         )
-        current = self.errors.get(traceback_string)
-
-        if current:
-            self.errors[traceback_string].append(packet)
-        else:
-            self.errors[traceback_string] = [packet]
-
-        async with self._lock:
-            # I want all other errors to be released after this one, which is why
-            # lock is here. If you have code that calls MANY errors VERY fast,
-            # this will ratelimit the webhook. We dont want that lmfao.
-
-            if not self._most_recent:
-                self._most_recent = discord.utils.utcnow()
-                await self.release_error(traceback_string, packet)
-            else:
-                time_between = packet['time'] - self._most_recent
-
-                if time_between > self.cooldown:
-                    self._most_recent = discord.utils.utcnow()
-                    return await self.release_error(traceback_string, packet)
-                else:  # We have to wait
-                    log.debug('Waiting %s seconds to release error', time_between.total_seconds())
-                    await asyncio.sleep(time_between.total_seconds())
-
-                    self._most_recent = discord.utils.utcnow()
-                    return await self.release_error(traceback_string, packet)
+        # Formatting is only worth it for reports, or the first time it's seen.
+        if not record.traceback or not (digest or suppressed):
+            if digest:
+                log.error('New error %s, holding it for the next digest', key, exc_info=error)
+            record.traceback = self._format_traceback(error)
+        self._persist(record, packet)
+
+        if digest:
+            if self._digester is None or self._digester.done():
+                self._digester = asyncio.create_task(self._digest())
+            return
+
+        if suppressed:
+            record.unreported += 1
+            return
+
+        packet['occurrences'] = record.unreported + 1
+        record.unreported = 0
+        record.last_reported = packet['time']
+        record.reset_pending()
+        try:
+            self._queue.put_nowait((record, packet))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self._dropped_types[type(error).__name__] += 1
+            log.error('Error queue is full, dropping error', exc_info=error)
+
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self._consume())
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict, Generic, Hashable, Tuple, TypeVar
+
+__all__: Tuple[str, ...] = ('KeyedLock',)
+
+K = TypeVar('K', bound=Hashable)
+
+
+class _Entry:
+    __slots__: Tuple[str, ...] = ('lock', 'users')
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0  # holders and waiters
+
+
+class _Acquire(Generic[K]):
+    __slots__: Tuple[str, ...] = ('parent', 'key', 'entry')
+
+    def __init__(self, parent: KeyedLock[K], key: K) -> None:
+        self.parent = parent
+        self.key = key
+
+    async def __aenter__(self) -> None:
+        parent = self.parent
+        entry = parent._entries.get(self.key)
+        if entry is None:
+            entry = parent._entries[self.key] = _Entry()
+        self.entry = entry
+        entry.users += 1
+        parent.acquired += 1
+
+        if not entry.lock.locked():
+            await entry.lock.acquire()
+            return
+
+        parent.contended += 1
+        started = time.perf_counter()
+        try:
+            await entry.lock.acquire()
+        except BaseException:
+            self._leave()
+            raise
+        waited = time.perf_counter() - started
+        parent.wait_total += waited
+        parent.wait_max = max(parent.wait_max, waited)
+
+    async def __aexit__(self, *args) -> None:
+        self.entry.lock.release()
+        self._leave()
+
+    def _leave(self) -> None:
+        self.entry.users -= 1
+        if not self.entry.users:
+            del self.parent._entries[self.key]
+
+
+class KeyedLock(Generic[K]):
+    """One :class:`asyncio.Lock` per key. Locks are dropped as soon as nobody holds
+    or waits on them, so only keys that are in use take memory.
+
+    .. code-block:: python3
+
+        async with locks(user.id):
+            ...
+
+    Attributes
+    ----------
+    acquired: :class:`int`
+        How many times a lock was acquired.
+    contended: :class:`int`
+        How many of those acquisitions had to wait for another holder.
+    wait_total: :class:`float`
+        The total time, in seconds, spent waiting on contended locks.
+    wait_max: :class:`float`
+        The longest wait, in seconds.
+    """
+
+    __slots__: Tuple[str, ...] = ('_entries', 'acquired', 'contended', 'wait_total', 'wait_max')
+
+    def __init__(self) -> None:
+        self._entries: Dict[K, _Entry] = {}
+        self.acquired: int = 0
+        self.contended: int = 0
+        self.wait_total: float = 0.0
+        self.wait_max: float = 0.0
+
+    def __call__(self, key: K) -> _Acquire[K]:
+        return _Acquire(self, key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def locked(self, key: K) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry.lock.locked()
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import pathlib
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Tuple
+
+__all__: Tuple[str, ...] = ('CommandSnapshot',)
+
+log = getLogger('TargetBot.snapshot')
+
+
+class CommandSnapshot:
+    """A gzipped JSON copy of the custom commands, so the bot can load them from disk
+    at boot instead of fetching every command from the database.
+
+    Rows are shaped like :attr:`TargetBot.CC_QUERY` rows, checksum included, so they
+    can be compared against the database to find what changed while the bot was off.
+
+    Attributes
+    ----------
+    path: :class:`pathlib.Path`
+        Where the snapshot is stored.
+    """
+
+    FORMAT = 2
+
+    __slots__: Tuple[str, ...] = ('path',)
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        self.path: pathlib.Path = pathlib.Path(path)
+
+    def load(self) -> Optional[List[Dict[str, Any]]]:
+        """Reads the snapshot.
+
+        Returns
+        -------
+            The rows, or ``None`` if there's no usable snapshot.
+        """
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            log.warning('Ignoring unreadable snapshot %s', self.path, exc_info=e)
+            return None
+
+        if not isinstance(data, dict) or data.get('format') != self.FORMAT:
+            log.warning('Ignoring snapshot %s with an unknown format', self.path)
+            return None
+        return data['commands']
+
+    def save(self, rows: List[Dict[str, Any]]) -> None:
+        """Replaces the snapshot with ``rows``. The file is swapped in atomically, so a
+        crash mid-write leaves the previous snapshot in place.
+
+        This does blocking IO, use :func:`asyncio.to_thread` from the event loop.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(self.path.name + '.tmp')
+        with gzip.open(temp, 'wt', encoding='utf-8') as fp:
+            json.dump({'format': self.FORMAT, 'commands': rows}, fp, separators=(',', ':'))
+        os.replace(temp, self.path)
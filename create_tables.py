@@ -1,19 +1,199 @@
+"""Brings the database schema up to date.
+
+    python create_tables.py          # applies the pending migrations
+    python create_tables.py --check  # EXPLAINs the hot queries and flags sequential scans
+
+Migrations are the ``migrations/NNNN_name.sql`` files, applied in order and recorded in
+the ``schema_migrations`` table. Each one runs in a transaction, unless its first line is
+``-- migrate: no-transaction``, which ``CREATE INDEX CONCURRENTLY`` needs. Those are run
+one ``;``-terminated statement at a time, so they should not contain functions.
+
+Run it before starting the bot after an update: the cogs query the columns migrations add,
+and a cog whose ``cog_load`` fails is not loaded at all.
+"""
+
+from __future__ import annotations
+
+import argparse
 import asyncio
+import json
+import logging
 import os
+import pathlib
+import re
+import sys
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Tuple
 
+import asyncpg
+from asyncpg.pool import PoolConnectionProxy
 from dotenv import load_dotenv
 
 from main import TargetBot
 
-async def runner():
+log = logging.getLogger('TargetBot.migrations')
+
+MIGRATIONS_DIR = pathlib.Path(__file__).parent / 'migrations'
+NO_TRANSACTION = '-- migrate: no-transaction'
+# Serializes runners, in case two deployments start at once.
+ADVISORY_LOCK_ID = 0x54425F4D
+
+VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+# A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind, which IF NOT EXISTS would then skip.
+INVALID_INDEXES = "SELECT indexrelid::regclass::text FROM pg_index WHERE NOT indisvalid"
+
+# (label, query, arguments, aliases that are expected to be scanned in full)
+HOT_QUERIES: List[Tuple[str, str, Tuple[Any, ...], Tuple[str, ...]]] = [
+    ('TargetBot.CC_QUERY', TargetBot.CC_QUERY, (), ('cc', 'alias')),
+    ('TargetBot.fetch_custom_command', TargetBot.CC_QUERY_ONE, ('name',), ()),
+    ('TargetBot.fetch_custom_commands', TargetBot.CC_QUERY_MANY, (['name'],), ()),
+    ('ModMail.cog_load', "SELECT * FROM modmail WHERE channel_id IS NOT NULL AND NOT archived", (), ()),
+    (
+        'ModMail.get_user_dm',
+        "INSERT INTO modmail (user_id) VALUES ($1) "
+        "ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id RETURNING *",
+        (0,),
+        (),
+    ),
+    ('ModMail.get_thread_dm', "SELECT * FROM modmail WHERE channel_id = $1", (0,), ()),
+    (
+        'ModMail.set_archived',
+        "UPDATE modmail SET archived = $2 WHERE channel_id = $1 AND archived <> $2",
+        (0, True),
+        (),
+    ),
+    ('ModMail.get_pair (DM)', "SELECT * FROM modmail_messages WHERE dm_message_id = $1", (0,), ()),
+    (
+        'ModMail.get_pair (thread)',
+        "SELECT * FROM modmail_messages WHERE thread_message_id = $1 ORDER BY part NULLS FIRST LIMIT 1",
+        (0,),
+        (),
+    ),
+    (
+        'ModMail.get_burst',
+        "SELECT * FROM modmail_messages WHERE thread_message_id = $1 ORDER BY part",
+        (0,),
+        (),
+    ),
+]
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: pathlib.Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text()
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql.startswith(NO_TRANSACTION)
+
+    def statements(self) -> Iterator[str]:
+        for statement in re.split(r';\s*$', self.sql, flags=re.MULTILINE):
+            code = '\n'.join(line for line in statement.splitlines() if not line.strip().startswith('--'))
+            if code.strip():
+                yield statement.strip()
+
+
+def discover() -> List[Migration]:
+    migrations = []
+    for path in MIGRATIONS_DIR.glob('*.sql'):
+        match = re.fullmatch(r'(\d+)_(\w+)\.sql', path.name)
+        if match is None:
+            raise RuntimeError(f'Migration file {path.name!r} is not named like 0001_name.sql')
+        migrations.append(Migration(int(match[1]), match[2], path))
+
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError('Two migrations share the same version number')
+    return migrations
+
+
+async def migrate(conn: asyncpg.Connection | PoolConnectionProxy) -> None:
+    """|coro| Applies every migration that's not in ``schema_migrations`` yet."""
+    await conn.execute(VERSION_TABLE)
+    await conn.execute('SELECT pg_advisory_lock($1)', ADVISORY_LOCK_ID)
+    try:
+        applied = {r['version'] for r in await conn.fetch('SELECT version FROM schema_migrations')}
+        for migration in discover():
+            if migration.version in applied:
+                continue
+
+            log.info('Applying migration %04d_%s', migration.version, migration.name)
+            record = "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)"
+            if migration.transactional:
+                async with conn.transaction():
+                    await conn.execute(migration.sql)
+                    await conn.execute(record, migration.version, migration.name)
+                continue
+
+            for statement in migration.statements():
+                await conn.execute(statement)
+            invalid = await conn.fetch(INVALID_INDEXES)
+            if invalid:
+                names = ', '.join(r[0] for r in invalid)
+                raise RuntimeError(f'Invalid indexes left behind, drop them and run again: {names}')
+            await conn.execute(record, migration.version, migration.name)
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', ADVISORY_LOCK_ID)
+
+
+def _seq_scans(plan: dict) -> Iterator[str]:
+    if plan['Node Type'] == 'Seq Scan':
+        yield plan.get('Alias', plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        yield from _seq_scans(child)
+
+
+async def check(conn: asyncpg.Connection | PoolConnectionProxy) -> bool:
+    """|coro| EXPLAINs :data:`HOT_QUERIES` and reports the ones that scan a whole table.
+
+    Sequential scans are disabled while planning, otherwise Postgres picks them for
+    small tables even when an index exists. A scan that still shows up means there
+    is no index the query can use.
+
+    Returns
+    -------
+        Whether every query passed.
+    """
+    ok = True
+    async with conn.transaction():
+        await conn.execute('SET LOCAL enable_seqscan = off')
+        for label, query, args, expected in HOT_QUERIES:
+            raw = await conn.fetchval(f'EXPLAIN (FORMAT JSON) {query}', *args)
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+            scans = [alias for alias in _seq_scans(plan) if alias not in expected]
+            if scans:
+                ok = False
+                print(f'SEQ SCAN  {label}: {", ".join(scans)}')
+            else:
+                print(f'ok        {label}')
+    return ok
+
+
+async def runner(args: argparse.Namespace) -> int:
     load_dotenv()
-    with open('schema.sql', 'r') as fp:
-        schema = fp.read()
+    async with TargetBot.temporary_pool(uri=os.environ['PG_DSN']) as pool, pool.acquire() as conn:
+        if args.check:
+            return 0 if await check(conn) else 1
+        await migrate(conn)
+    return 0
 
-    async with (
-        TargetBot.temporary_pool(uri=os.environ['PG_DSN']) as pool,
-        pool.acquire() as conn, conn.transaction()
-    ):
-        await conn.execute(schema)
 
-asyncio.run(runner())
\ No newline at end of file
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='EXPLAIN the hot queries and flag sequential scans')
+    sys.exit(asyncio.run(runner(parser.parse_args())))
@@ -7,10 +7,13 @@ import os
 import aiohttp
 from dotenv import load_dotenv
 from discord.ext import commands
+from asyncpg.pool import PoolConnectionProxy
 from asyncpg.transaction import Transaction
-from typing import Type, Tuple, Generic, Optional, TypeVar
-from cogs.utils.custom_commands import HandlerCommand
+from typing import Any, Counter, Type, Tuple, Generic, Iterable, Mapping, Optional, TypeVar
+from cogs.utils.custom_commands import CommandIndex, HandlerCommand
+from cogs.utils.cooldowns import SlidingWindow
 from cogs.utils.error_manager import ExceptionsManager
+from cogs.utils.snapshot import CommandSnapshot
 
 _log = logging.getLogger("TargetBot")
 
@@ -122,22 +125,50 @@ class TargetBot(commands.Bot):
         "cogs.modmail",
     )
 
-    CC_QUERY = """
-        SELECT 
+    # One join and one aggregate for every command, instead of an alias subquery per command.
+    # Grouping by the primary key lets the other cc columns be selected as they are.
+    _CC_SELECT = """
+        SELECT
         cc.command_string,
         cc.command_content,
         cc.embed,
-        (SELECT ARRAY(
-            SELECT command_string
-            FROM custom_commands
-            WHERE aliases_to = cc.command_string
-        )) AS aliases,
-        cc.description
+        COALESCE(
+            ARRAY_AGG(alias.command_string ORDER BY alias.command_string) FILTER (WHERE alias.command_string IS NOT NULL),
+            '{}'
+        ) AS aliases,
+        cc.description,
+        cc.cooldown_rate,
+        cc.cooldown_per
         FROM custom_commands AS cc
-        WHERE aliases_to ISNULL
+        LEFT JOIN custom_commands AS alias ON alias.aliases_to = cc.command_string
+        WHERE cc.aliases_to ISNULL
     """
+    # Adds an md5 of each row, to tell which commands a snapshot has out of date.
+    _CC_CHECKSUM = (
+        "SELECT *, MD5(ROW(command_content, embed, aliases, description, cooldown_rate, cooldown_per)::text) AS checksum FROM ("
+    )
+    CC_QUERY = _CC_CHECKSUM + _CC_SELECT + "GROUP BY cc.command_string) AS command"
+    CC_QUERY_ONE = _CC_CHECKSUM + _CC_SELECT + "AND cc.command_string = $1\nGROUP BY cc.command_string) AS command"
+    CC_QUERY_MANY = (
+        _CC_CHECKSUM + _CC_SELECT + "AND cc.command_string = ANY($1::text[])\nGROUP BY cc.command_string) AS command"
+    )
+    CC_CHECKSUMS = "SELECT command_string, checksum FROM (" + CC_QUERY + ") AS checksums"
+
+    # Notified by the custom_commands trigger with the name of the parent command that changed.
+    CC_CHANNEL = "custom_commands"
+    # Notifications arriving within this many seconds are reloaded in one query.
+    CC_RELOAD_DELAY = 0.5
+    # Changes within this many seconds are written to the snapshot at once.
+    CC_SNAPSHOT_DELAY = 5.0
+    # (rate, per) for commands without a cooldown of their own. Cooldowns are opt-in, e.g. (1, 15.0)
+    # would hold every command to one answer per channel every 15 seconds.
+    CC_DEFAULT_COOLDOWN: Optional[Tuple[int, float]] = None
+    # Added to invocations that are suppressed by the cooldown, pointing at the answer above.
+    CC_SUPPRESSED_REACTION = "\N{WHITE UP POINTING INDEX}"
 
     def __init__(self, pool: asyncpg.Pool[asyncpg.Record], session: aiohttp.ClientSession):
+        # Set before super().__init__, which already adds the help command.
+        self.command_index = CommandIndex()
         super().__init__(
             command_prefix="!",
             intents=discord.Intents.all(),
@@ -149,6 +180,17 @@ class TargetBot(commands.Bot):
         self.pool: asyncpg.Pool[asyncpg.Record] = pool
         self.session: aiohttp.ClientSession = session
         self.errors = ExceptionsManager(self)
+        self._cc_listener: Optional[PoolConnectionProxy[asyncpg.Record]] = None
+        self._pending_reloads: set[str] = set()
+        self._reload_task: Optional[asyncio.Task[None]] = None
+        self._relisten_task: Optional[asyncio.Task[None]] = None
+        self.snapshot = CommandSnapshot(os.environ.get("CC_SNAPSHOT_PATH", "custom_commands.snapshot.json.gz"))
+        self._snapshot_task: Optional[asyncio.Task[None]] = None
+        self._reconcile_task: Optional[asyncio.Task[None]] = None
+        # Opt-in, see dispatch_custom_command.
+        self.fast_custom_commands: bool = os.environ.get("CC_FAST_PATH") == "1"
+        self.cc_cooldowns: SlidingWindow[Tuple[str, int]] = SlidingWindow()
+        self.cc_suppressed: Counter[str] = Counter()
 
     async def on_ready(self):
         _log.info("Logged in as %s", self.user)
@@ -161,22 +203,321 @@ class TargetBot(commands.Bot):
                 _log.info("Loaded extension %s", ext)
             except Exception as e:
                 _log.error("Could not load extension %s", ext, exc_info=e)
-        await self.populate_custom_commands()
+        rows = await asyncio.to_thread(self.snapshot.load)
+        if rows is None:
+            await self.populate_custom_commands()
+        else:
+            for row in rows:
+                try:
+                    self.add_command(row)
+                except commands.CommandRegistrationError as e:
+                    _log.warning("Could not load custom command %s from the snapshot", row['command_string'], exc_info=e)
+            _log.info("Loaded %s custom commands from the snapshot", len(rows))
+        try:
+            await self.listen_custom_commands()
+        except Exception as e:
+            # Retried in the background, which reconciles every command once listening.
+            _log.warning("Could not listen for custom command changes, retrying", exc_info=e)
+            self._relisten_task = asyncio.create_task(self._relisten())
+        else:
+            if rows is not None:
+                # After listening, so changes made while reconciling are not missed.
+                self._reconcile_task = asyncio.create_task(self.reconcile_custom_commands())
+
+    async def close(self) -> None:
+        if self._cc_listener is not None:
+            conn, self._cc_listener = self._cc_listener, None
+            conn.remove_termination_listener(self._on_listener_terminated)
+            await self.pool.release(conn)  # resetting the connection also UNLISTENs
+        for task in (self._reload_task, self._relisten_task, self._reconcile_task):
+            if task is not None:
+                task.cancel()
+        if self._snapshot_task is not None and not self._snapshot_task.done():
+            self._snapshot_task.cancel()
+            await self.save_snapshot()
+        await self.errors.close()
+        await super().close()
+
+    async def process_commands(self, message: discord.Message, /) -> None:
+        if self.fast_custom_commands and not message.author.bot and await self.dispatch_custom_command(message):
+            return
+        await super().process_commands(message)
+
+    async def dispatch_custom_command(self, message: discord.Message) -> bool:
+        """|coro| Sends a custom command's pre-serialized payload straight to the channel.
+
+        Custom commands take no arguments and have no checks, so building a context,
+        parsing and invoking is skipped. ``on_command`` and ``on_command_completion``
+        are not dispatched for them. Enabled with ``CC_FAST_PATH=1``.
+
+        Parameters
+        ----------
+        message: :class:`discord.Message`
+            The message that may be invoking a custom command.
+
+        Returns
+        -------
+            Whether the message was a custom command and was handled.
+        """
+        prefix = self.command_prefix
+        if not isinstance(prefix, str) or not message.content.startswith(prefix):
+            return False
+        rest = message.content[len(prefix) :]
+        if not rest or rest[0].isspace():
+            return False
+
+        command = self.all_commands.get(rest.split(maxsplit=1)[0])
+        if not isinstance(command, HandlerCommand) or not command.enabled:
+            return False
+
+        if not await self.check_custom_cooldown(command, message):
+            return True
+        try:
+            await self.http.send_message(message.channel.id, params=command.payload(self.allowed_mentions))
+        except discord.HTTPException as e:
+            await self.errors.add_error(error=e, ctx=f"custom command {command.name}")
+        return True
+
+    async def check_custom_cooldown(self, command: HandlerCommand, message: discord.Message, *, react: bool = True) -> bool:
+        """|coro| Whether ``command`` may answer in the channel of ``message``.
+
+        When it may not, the same answer was just sent there, so the invocation is
+        reacted to instead, and counted in :attr:`cc_suppressed`.
+
+        Parameters
+        ----------
+        command: :class:`HandlerCommand`
+            The invoked command.
+        message: :class:`discord.Message`
+            The invoking message.
+        react: :class:`bool`
+            Whether to react to a suppressed invocation. Messages that merely mention
+            a trigger phrase did not ask for the answer, so they are left alone.
+        """
+        cooldown = command.cc_cooldown or self.CC_DEFAULT_COOLDOWN
+        if cooldown is None:
+            return True
+        rate, per = cooldown
+        if not rate or self.cc_cooldowns.hit((command.name, message.channel.id), rate=rate, per=per):
+            return True
+
+        self.cc_suppressed[command.name] += 1
+        if not react:
+            return False
+        try:
+            await message.add_reaction(self.CC_SUPPRESSED_REACTION)
+        except discord.HTTPException:
+            pass
+        return False
 
     async def populate_custom_commands(self):
         """|coro| Pulls commands from the database and populates the handler."""
         data = await self.pool.fetch(self.CC_QUERY)
         for record in data:
             self.add_command(record)
+        await self.save_snapshot()
 
-    def add_command(self, record: asyncpg.Record | commands.Command) -> None:
+    async def reconcile_custom_commands(self) -> None:
+        """|coro| Brings commands loaded from the snapshot up to date with the database.
+
+        Only names and checksums are compared, commands that changed are then fetched in
+        one batch. Retries with backoff until the database answers.
+        """
+        delay = 1.0
+        while True:
+            try:
+                remote = {r['command_string']: r['checksum'] for r in await self.pool.fetch(self.CC_CHECKSUMS)}
+                local = {c.name: c.checksum for c in self.commands if isinstance(c, HandlerCommand)}
+                changed = [name for name, checksum in remote.items() if local.get(name) != checksum]
+                records = await self.fetch_custom_commands(changed) if changed else []
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                _log.warning("Could not reconcile custom commands, retrying in %.0fs", delay, exc_info=e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+            break
+
+        removed = local.keys() - remote.keys()
+        _log.info("Reconciled custom commands: %s changed, %s removed", len(changed), len(removed))
+        if changed or removed:
+            self.apply_custom_commands([*changed, *removed], records)
+
+    async def save_snapshot(self) -> None:
+        """|coro| Writes the loaded custom commands to :attr:`snapshot`."""
+        rows = [c.to_row() for c in self.commands if isinstance(c, HandlerCommand)]
+        try:
+            await asyncio.to_thread(self.snapshot.save, rows)
+        except OSError as e:
+            _log.warning("Could not write the custom commands snapshot", exc_info=e)
+
+    def schedule_snapshot(self) -> None:
+        """Saves the snapshot after :attr:`CC_SNAPSHOT_DELAY`, so a burst of changes is written once."""
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.create_task(self._delayed_snapshot())
+
+    async def _delayed_snapshot(self) -> None:
+        await asyncio.sleep(self.CC_SNAPSHOT_DELAY)
+        await self.save_snapshot()
+
+    async def fetch_custom_command(
+        self, name: str, *, conn: asyncpg.Connection | None = None
+    ) -> Optional[asyncpg.Record]:
+        """|coro| Fetches a single custom command, in the same shape as :attr:`CC_QUERY` rows.
+
+        asyncpg prepares and caches the statement per connection, so repeated loads
+        skip parsing and planning.
+
+        Parameters
+        ----------
+        name: :class:`str`
+            The name of the command. Aliases are not resolved.
+        conn: Optional[:class:`asyncpg.Connection`]
+            The connection to use, for example to see uncommitted changes. Defaults to the pool.
+
+        Returns
+        -------
+            The record, or ``None`` if there's no command with that name.
+        """
+        return await (conn or self.pool).fetchrow(self.CC_QUERY_ONE, name)
+
+    async def fetch_custom_commands(
+        self, names: Iterable[str], *, conn: asyncpg.Connection | None = None
+    ) -> list[asyncpg.Record]:
+        """|coro| Fetches many custom commands in one round trip.
+
+        Parameters
+        ----------
+        names: Iterable[:class:`str`]
+            The names of the commands. Names that don't exist are skipped.
+        conn: Optional[:class:`asyncpg.Connection`]
+            The connection to use. Defaults to the pool.
+
+        Returns
+        -------
+            The records that were found, in no particular order.
+        """
+        return await (conn or self.pool).fetch(self.CC_QUERY_MANY, list(names))
+
+    async def listen_custom_commands(self) -> None:
+        """|coro| Holds a connection that LISTENs for changes to the custom_commands table.
+
+        Changes made by other instances or straight in the database are reloaded as they
+        are notified, one command at a time. If the connection is lost, it's re-established
+        and every command is reconciled, since notifications are not queued meanwhile.
+        """
+        conn = await self.pool.acquire()
+        try:
+            await conn.add_listener(self.CC_CHANNEL, self._on_custom_command_notify)
+        except BaseException:
+            await self.pool.release(conn)
+            raise
+        conn.add_termination_listener(self._on_listener_terminated)
+        self._cc_listener = conn
+
+    def _on_custom_command_notify(
+        self, conn: asyncpg.Connection | PoolConnectionProxy, pid: int, channel: str, payload: object, /
+    ) -> None:
+        self._pending_reloads.add(str(payload))
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload_custom_commands())
+
+    async def _reload_custom_commands(self) -> None:
+        delay = self.CC_RELOAD_DELAY
+        while self._pending_reloads and not self.is_closed():
+            await asyncio.sleep(delay)
+            names, self._pending_reloads = self._pending_reloads, set()
+            try:
+                records = await self.fetch_custom_commands(names)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                # Put back, along with anything notified meanwhile.
+                self._pending_reloads |= names
+                delay = min(max(delay * 2, 1.0), 60.0)
+                _log.warning("Could not reload custom commands %s, retrying in %.0fs", ", ".join(names), delay, exc_info=e)
+                continue
+            delay = self.CC_RELOAD_DELAY
+            self.apply_custom_commands(names, records)
+
+    def _on_listener_terminated(self, conn: asyncpg.Connection | PoolConnectionProxy, /) -> None:
+        listener = self._cc_listener
+        if listener is None or listener is not conn:
+            return
+        self._cc_listener = None
+        _log.warning("Lost the custom commands listener, reconnecting")
+        self._relisten_task = asyncio.create_task(self._relisten(listener))
+
+    async def _relisten(self, dead: Optional[PoolConnectionProxy[asyncpg.Record]] = None) -> None:
+        if dead is not None:
+            await self.pool.release(dead)
+        delay = 1.0
+        while not self.is_closed():
+            try:
+                await self.listen_custom_commands()
+                records = await self.pool.fetch(self.CC_QUERY)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                _log.warning("Could not listen for custom command changes, retrying in %.0fs", delay, exc_info=e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+            names = [c.name for c in self.commands if isinstance(c, HandlerCommand)]
+            self.apply_custom_commands(names, records)
+            return
+
+    def _drop_alias(self, command: HandlerCommand, alias: str) -> None:
+        alias = next(a for a in command.aliases if a.lower() == alias.lower())
+        self.remove_command(alias)
+        command.aliases = [a for a in command.aliases if a != alias]
+
+    def apply_custom_commands(self, names: Iterable[str], records: Iterable[asyncpg.Record]) -> None:
+        """Replaces the loaded custom commands called ``names`` with ``records``.
+
+        Names without a matching record are removed. Aliases that moved to another
+        command are taken away from the command that held them.
+
+        Parameters
+        ----------
+        names: Iterable[:class:`str`]
+            The parent command names to replace.
+        records: Iterable[:class:`asyncpg.Record`]
+            The current rows for those commands, shaped like :attr:`CC_QUERY` rows.
+        """
+        found = {r['command_string']: r for r in records}
+        for name in set(names) | found.keys():
+            old = self.all_commands.get(name)
+            if isinstance(old, HandlerCommand):
+                if old.name.lower() == name.lower():
+                    self.remove_command(old.name)
+                else:  # an alias that became a command of its own
+                    self._drop_alias(old, name)
+            elif old is not None:
+                _log.warning("Custom command %s clashes with a built-in command, skipping", name)
+                continue
+
+            record = found.get(name)
+            if record is None:
+                continue
+            for alias in record['aliases']:
+                holder = self.all_commands.get(alias)
+                if not isinstance(holder, HandlerCommand):
+                    continue
+                if holder.name.lower() == alias.lower():
+                    self.remove_command(holder.name)
+                else:
+                    self._drop_alias(holder, alias)
+            try:
+                self.add_command(record)
+            except commands.CommandRegistrationError as e:
+                _log.warning("Could not load custom command %s", name, exc_info=e)
+        self.schedule_snapshot()
+
+    def add_command(self, record: asyncpg.Record | Mapping[str, Any] | commands.Command) -> None:
         """ "It takes a record from the database and creates a HandlerCommand object from it
 
         Parameters
         ----------
-        record: :class:`asyncpg.Record` | :class:`commands.Command`
-            A database record with the necessary data, which is:
-                name: str, content: str?, embed: json?, aliases: list[str]?
+        record: :class:`asyncpg.Record` | Mapping[:class:`str`, Any] | :class:`commands.Command`
+            A database record or snapshot row with the necessary data, which is:
+                command_string: str, command_content: str?, embed: json?, aliases: list[str],
+                description: str?, cooldown_rate: int?, cooldown_per: float?, checksum: str?
 
         Returns
         -------
@@ -184,10 +525,41 @@ class TargetBot(commands.Bot):
 
         """
         if isinstance(record, commands.Command):
-            return super().add_command(record)
-        name, content, embed, aliases, description = record
-        command = HandlerCommand(name=name, aliases=aliases, content=content, embed=embed, description=description)
-        return super().add_command(command)
+            command = record
+        else:
+            command = HandlerCommand(
+                name=record['command_string'],
+                aliases=record['aliases'],
+                content=record['command_content'],
+                embed=record['embed'],
+                description=record['description'],
+                cooldown_rate=record['cooldown_rate'],
+                cooldown_per=record['cooldown_per'],
+                checksum=record['checksum'],
+            )
+        super().add_command(command)
+        if isinstance(command, HandlerCommand):
+            self.command_index.add_command(command)
+
+    def remove_command(self, name: str) -> Optional[commands.Command]:
+        """Removes a command or alias, and drops it from the autocomplete index.
+
+        Parameters
+        ----------
+        name: :class:`str`
+            The name or alias of the command to remove.
+
+        Returns
+        -------
+            The command that was removed, or ``None`` if it was not found.
+        """
+        command = super().remove_command(name)
+        if isinstance(command, HandlerCommand):
+            if name.lower() != command.name.lower():
+                self.command_index.remove(name)
+            else:
+                self.command_index.remove_command(command)
+        return command
 
     @classmethod
     async def setup_pool(cls, *, uri: str, **kwargs) -> asyncpg.Pool:
@@ -0,0 +1,35 @@
+ 
+CREATE TABLE IF NOT EXISTS modmail (
+    user_id BIGINT PRIMARY KEY,
+    channel_id BIGINT NULL
+);
+
+-- Set while the ticket's thread is archived or deleted, channel_id is kept so it can be reopened.
+ALTER TABLE modmail ADD COLUMN IF NOT EXISTS archived BOOLEAN NOT NULL DEFAULT FALSE;
+
+ALTER TABLE modmail ADD COLUMN IF NOT EXISTS dm_channel_id BIGINT NULL;
+CREATE INDEX IF NOT EXISTS modmail_dm_channel_id_idx ON modmail (dm_channel_id);
+
+
+CREATE TABLE IF NOT EXISTS custom_commands(
+    command_string TEXT PRIMARY KEY,
+    description TEXT,
+    command_content TEXT,
+    embed JSONB,
+    aliases_to TEXT REFERENCES custom_commands(command_string) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS modmail_messages (
+    dm_message_id BIGINT NOT NULL,
+    thread_message_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL REFERENCES modmail(user_id) ON DELETE CASCADE,
+    dm_channel_id BIGINT NOT NULL,
+    thread_id BIGINT NOT NULL,
+    webhook_id BIGINT NULL,
+    PRIMARY KEY (dm_message_id, thread_message_id)
+);
+
+-- The primary key already covers lookups by dm_message_id.
+CREATE INDEX IF NOT EXISTS modmail_messages_thread_message_id_idx ON modmail_messages (thread_message_id);
+-- Set when several DMs were coalesced into one thread message, the order of this DM among them.
+ALTER TABLE modmail_messages ADD COLUMN IF NOT EXISTS part SMALLINT NULL;
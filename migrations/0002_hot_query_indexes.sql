@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- Built concurrently so an existing install keeps serving while they're created.
+
+-- ModMail.get_thread_dm looks sessions up by their thread. Closed tickets have no thread.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS modmail_channel_id_idx ON modmail (channel_id) WHERE channel_id IS NOT NULL;
+
+-- TargetBot.CC_QUERY gathers the aliases of every command by aliases_to.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS custom_commands_aliases_to_idx ON custom_commands (aliases_to) WHERE aliases_to IS NOT NULL;
@@ -0,0 +1,20 @@
+-- Tells every running instance which command changed, so it can reload just that one.
+-- The payload is the parent command's name, aliases notify their parent. Postgres drops
+-- duplicate notifications within a transaction, so editing a command and its aliases
+-- together sends one notification.
+CREATE OR REPLACE FUNCTION custom_commands_notify() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('custom_commands', COALESCE(OLD.aliases_to, OLD.command_string));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('custom_commands', COALESCE(NEW.aliases_to, NEW.command_string));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS custom_commands_notify ON custom_commands;
+CREATE TRIGGER custom_commands_notify
+    AFTER INSERT OR UPDATE OR DELETE ON custom_commands
+    FOR EACH ROW EXECUTE FUNCTION custom_commands_notify();
@@ -0,0 +1,4 @@
+-- Per channel, a command answers at most cooldown_rate times every cooldown_per seconds.
+-- NULL uses the bot's default (TargetBot.CC_DEFAULT_COOLDOWN, none out of the box), a rate of 0 turns the cooldown off.
+ALTER TABLE custom_commands ADD COLUMN IF NOT EXISTS cooldown_rate SMALLINT NULL CHECK (cooldown_rate >= 0);
+ALTER TABLE custom_commands ADD COLUMN IF NOT EXISTS cooldown_per REAL NULL CHECK (cooldown_per > 0);
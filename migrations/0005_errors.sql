@@ -0,0 +1,17 @@
+-- Every error occurrence reported to ExceptionsManager, written in batches.
+-- traceback is the latest one formatted for the fingerprint, command is the command or event name.
+CREATE TABLE IF NOT EXISTS errors (
+    id BIGSERIAL PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    traceback TEXT NOT NULL,
+    command TEXT NULL,
+    guild_id BIGINT NULL,
+    channel_id BIGINT NULL,
+    author_id BIGINT NULL,
+    occurred_at TIMESTAMPTZ NOT NULL
+);
+
+-- Retention pruning.
+CREATE INDEX IF NOT EXISTS errors_occurred_at_idx ON errors (occurred_at);
+-- Trends for one fingerprint.
+CREATE INDEX IF NOT EXISTS errors_fingerprint_idx ON errors (fingerprint, occurred_at);
@@ -0,0 +1,8 @@
+-- Phrases the autohelp cog answers to when members without a ranked role say them.
+-- The answer is the given custom command, or the built-in downloads help when command is NULL.
+CREATE TABLE IF NOT EXISTS autohelp_triggers (
+    phrase TEXT PRIMARY KEY,
+    command TEXT NULL REFERENCES custom_commands(command_string) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+INSERT INTO autohelp_triggers (phrase) VALUES ('download') ON CONFLICT DO NOTHING;